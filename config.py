@@ -1,11 +1,25 @@
+import contextvars
 import os
 from dotenv import load_dotenv
-from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.lite_llm import LiteLlm, LiteLLMClient
 import litellm
 
-# Load environment variables
+# Load environment variables (the one place .env is read; modules import their settings from here)
 load_dotenv(override=True)
 
+# MCP server configuration (shared by the sub-agents)
+MCP_PORT = os.getenv("MCP_PORT")
+if not MCP_PORT:
+    raise RuntimeError("MCP_PORT environment variable is required for MCP_SERVER_URL")
+try:
+    MCP_PORT_INT = int(MCP_PORT)
+except ValueError:
+    raise RuntimeError(f"Invalid MCP_PORT value: {MCP_PORT}")
+MCP_SERVER_URL = f"http://localhost:{MCP_PORT_INT}"
+# Separate connect/read budgets; the older MCP_CONNECTION_TIMEOUT is still honored as the read budget
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "1.0"))
+MCP_READ_TIMEOUT = float(os.getenv("MCP_READ_TIMEOUT", os.getenv("MCP_CONNECTION_TIMEOUT", "8.0")))
+
 # LiteLLM Configuration
 LITELLM_PROXY_API_KEY = os.getenv("LITELLM_PROXY_API_KEY", "sk-122103")
 LITELLM_PROXY_API_BASE = os.getenv("LITELLM_PROXY_API_BASE", "https://litellm.armaddia.lat")
@@ -18,17 +32,40 @@ os.environ["LITELLM_PROXY_API_BASE"] = LITELLM_PROXY_API_BASE
 # Configure LiteLLM to use proxy
 litellm.use_litellm_proxy = True
 
+# Per-request session/user for LiteLLM cost tracking. Set by call_agent_async; context
+# variables follow each asyncio task, so concurrent conversations don't overwrite each other.
+LITELLM_SESSION_ID = contextvars.ContextVar("litellm_session_id", default=None)
+LITELLM_USER_ID = contextvars.ContextVar("litellm_user_id", default=None)
+
+
+class TrackedLiteLLMClient(LiteLLMClient):
+    """Adds the current session/user from the context to every LiteLLM completion."""
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        session_id = LITELLM_SESSION_ID.get()
+        user_id = LITELLM_USER_ID.get()
+        if session_id or user_id:
+            metadata = dict(kwargs.pop("metadata", None) or {})
+            if session_id:
+                metadata["litellm_session_id"] = session_id
+            if user_id:
+                metadata["user_id"] = user_id
+                kwargs.setdefault("user", user_id)
+            kwargs["metadata"] = metadata
+        return await super().acompletion(model, messages, tools, **kwargs)
+
+
 # Model configuration - all agents will use LiteLLM for cost tracking
 DEFAULT_MODEL = os.getenv("AGENT_MODEL")
 
 # LiteLLM model instances for cost tracking
-MAIN_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-SUB_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-INFO_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-APPLICATION_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-FAQ_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-FOLLOW_UP_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
-CONTACT_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL)
+MAIN_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+SUB_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+INFO_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+APPLICATION_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+FAQ_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+FOLLOW_UP_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
+CONTACT_AGENT_MODEL = LiteLlm(model=LITELLM_MODEL, llm_client=TrackedLiteLLMClient())
 
 # Logging
 import logging
@@ -1,12 +1,7 @@
 from google.adk.agents import Agent
-import os
-from dotenv import load_dotenv
 from datetime import datetime
 import logging
 
-# Load environment variables from .env file in the current directory
-load_dotenv(override=True)
-
 # Import centralized config
 from config import MAIN_AGENT_MODEL
 
@@ -9,19 +9,11 @@ from google.adk.agents import Agent
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools import transfer_to_agent, mcp_tool
 # Import centralized config
-from config import APPLICATION_AGENT_MODEL
+from config import APPLICATION_AGENT_MODEL, MCP_SERVER_URL
 
 logger = logging.getLogger(__name__)
 
 # MCP Configuration Constants
-MCP_PORT = os.getenv("MCP_PORT")
-if not MCP_PORT:
-    raise RuntimeError("MCP_PORT environment variable is required for MCP_SERVER_URL")
-try:
-    MCP_PORT_INT = int(MCP_PORT)
-except ValueError:
-    raise RuntimeError(f"Invalid MCP_PORT value: {MCP_PORT}")
-MCP_SERVER_URL = f"http://localhost:{MCP_PORT_INT}"  # Dynamic URL from env
 MCP_CONNECTION_TIMEOUT = 30  # Timeout in seconds
 
 # ADDED: EGO API Configuration from environment variables
@@ -1,23 +1,12 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool, ToolContext, transfer_to_agent
 import logging
-import os
-from dotenv import load_dotenv
 
 # Import centralized config  
 from config import CONTACT_AGENT_MODEL
 
-# Construct path to the parent directory's .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path, override=True)
-
-# Configure logging
+# Logging is configured by the host application (main.py)
 logger = logging.getLogger(__name__)
-if not logger.handlers:
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
 
 def check_current_state(tool_context: ToolContext) -> dict:
     """
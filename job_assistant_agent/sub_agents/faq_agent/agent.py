@@ -1,22 +1,11 @@
 from google.adk.agents import Agent
 from google.adk.tools import transfer_to_agent
 import logging
-import os
-from dotenv import load_dotenv
 
 # Import centralized config
 from config import FAQ_AGENT_MODEL
 
-# Construct path to the parent directory's .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path, override=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Logging is configured by the host application (main.py)
 logger = logging.getLogger(__name__)
 
 # Create the FAQ Agent
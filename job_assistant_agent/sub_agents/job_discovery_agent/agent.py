@@ -1,40 +1,130 @@
 from google.adk.agents import Agent
 from google.adk.tools import transfer_to_agent
 from google.adk.tools.tool_context import ToolContext
-import json
+import aiohttp
+import asyncio
+import functools
 import logging
 import os
-import requests
-from dotenv import load_dotenv
+import orjson
+import time
 
 # Import centralized config
-from config import INFO_AGENT_MODEL
+from config import INFO_AGENT_MODEL, MCP_SERVER_URL, MCP_CONNECT_TIMEOUT, MCP_READ_TIMEOUT
 
-# Construct path to the parent directory's .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path, override=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Logging is configured by the host application (main.py)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-MCP_PORT = os.getenv("MCP_PORT")
-if not MCP_PORT:
-    raise RuntimeError("MCP_PORT environment variable is required for MCP_SERVER_URL")
-try:
-    MCP_PORT_INT = int(MCP_PORT)
-except ValueError:
-    raise RuntimeError(f"Invalid MCP_PORT value: {MCP_PORT}")
-MCP_SERVER_URL = f"http://localhost:{MCP_PORT_INT}"
-MCP_CONNECTION_TIMEOUT = int(os.getenv("MCP_CONNECTION_TIMEOUT", "5"))
-
-
-def get_available_vacantes(offset: int = 0, tool_context: ToolContext = None) -> dict:
+_MCP_TIMEOUT = aiohttp.ClientTimeout(connect=MCP_CONNECT_TIMEOUT, sock_read=MCP_READ_TIMEOUT)
+
+# Bounded retry for connect failures and gateway errors; read timeouts are not retried
+MCP_MAX_RETRIES = 2
+MCP_RETRY_BACKOFF = 0.2
+MCP_RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Shared keep-alive aiohttp session for MCP calls, created lazily on the running event loop
+_http_session = None
+_http_session_lock = asyncio.Lock()
+
+
+async def _get_http_session() -> aiohttp.ClientSession:
+    """Return the shared MCP ClientSession, creating it on first use."""
+    global _http_session
+    async with _http_session_lock:
+        if _http_session is None or _http_session.closed:
+            _http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=30)
+            )
+    return _http_session
+
+
+async def close() -> None:
+    """Close the shared MCP ClientSession (awaited from the host's shutdown handler)."""
+    global _http_session
+    async with _http_session_lock:
+        if _http_session is not None and not _http_session.closed:
+            await _http_session.close()
+        _http_session = None
+
+# Agent instruction lives in instructions/job_discovery.md and is read once at import
+INSTRUCTION_PATH = os.path.join(os.path.dirname(__file__), 'instructions', 'job_discovery.md')
+
+
+@functools.lru_cache(maxsize=1)
+def _load_instruction() -> str:
+    """Read the agent instruction from disk (cached after the first call)."""
+    with open(INSTRUCTION_PATH, encoding='utf-8') as f:
+        return f.read()
+
+
+_INSTRUCTION = _load_instruction()
+
+# Page cache for search_available_vacancies: offset -> (fetched_at, response data).
+# Pages are the same for every caller, so the cache is shared; the next page is
+# prefetched with a background task while the user reads the current one. Both maps
+# are only touched from the event loop, so they need no lock.
+VACANTES_PAGE_SIZE = 10
+VACANTES_CACHE_TTL = float(os.getenv("VACANTES_CACHE_TTL", "60"))
+_CACHE = {}
+_prefetch_tasks = {}  # offset -> in-flight prefetch task
+
+
+async def _fetch_vacantes_page(offset: int) -> dict:
+    """POST to the MCP server and return the decoded page (raises on HTTP/JSON errors)."""
+    session = await _get_http_session()
+    for attempt in range(MCP_MAX_RETRIES + 1):
+        try:
+            async with session.post(
+                f"{MCP_SERVER_URL}/mcp/tool/search_available_vacancies",
+                json={"detail_level": "summary", "offset": offset, "limit": VACANTES_PAGE_SIZE},
+                timeout=_MCP_TIMEOUT
+            ) as response:
+                logger.info(f"📡📡📡 MCP Response status: {response.status}")
+                if response.status in MCP_RETRY_STATUSES and attempt < MCP_MAX_RETRIES:
+                    retry_reason = f"HTTP {response.status}"
+                else:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+        except aiohttp.ClientConnectorError as e:
+            if attempt >= MCP_MAX_RETRIES:
+                raise
+            retry_reason = repr(e)
+        delay = MCP_RETRY_BACKOFF * (2 ** attempt)
+        logger.warning(f"search_available_vacancies offset {offset} failed ({retry_reason}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def _get_cached_page(offset: int):
+    entry = _CACHE.get(offset)
+    if entry and time.monotonic() - entry[0] < VACANTES_CACHE_TTL:
+        return entry[1]
+    _CACHE.pop(offset, None)
+    return None
+
+
+async def _fetch_and_cache(offset: int) -> dict:
+    data = await _fetch_vacantes_page(offset)
+    if data.get("results"):
+        _CACHE[offset] = (time.monotonic(), data)
+    return data
+
+
+def _prefetch_page(offset: int) -> None:
+    """Fetch a page in the background so the next get_available_vacantes call is a cache hit."""
+    if _get_cached_page(offset) is not None or offset in _prefetch_tasks:
+        return
+    task = asyncio.get_running_loop().create_task(_fetch_and_cache(offset))
+    _prefetch_tasks[offset] = task
+    task.add_done_callback(lambda t: _prefetch_done(offset, t))
+
+
+def _prefetch_done(offset: int, task) -> None:
+    _prefetch_tasks.pop(offset, None)
+    if not task.cancelled() and task.exception():
+        logger.debug(f"Prefetch of vacantes offset {offset} failed: {task.exception()}")
+
+
+async def get_available_vacantes(offset: int = 0, tool_context: ToolContext = None) -> dict:
     """
     Get a paginated list of available job vacancies from the MCP server.
     
@@ -45,22 +135,19 @@ def get_available_vacantes(offset: int = 0, tool_context: ToolContext = None) ->
     print(f"🔧🔧🔧 MCP TOOL CALLED: get_available_vacantes starting execution")
     
     try:
-        mcp_url = f"{MCP_SERVER_URL}/mcp/tool/search_available_vacancies"
-        logger.info(f"📡📡📡 Making HTTP request to MCP server: {mcp_url}")
-        print(f"📡📡📡 HTTP REQUEST to MCP: {mcp_url}")
-        
-        response = requests.post(
-            mcp_url,
-            json={"detail_level": "summary", "offset": offset, "limit": 10},
-            timeout=float(MCP_CONNECTION_TIMEOUT)
-        )
-        
-        logger.info(f"📡📡📡 MCP Response status: {response.status_code}")
-        print(f"📡📡📡 MCP RESPONSE STATUS: {response.status_code}")
-        
-        response.raise_for_status()
-        
-        data = response.json()
+        data = _get_cached_page(offset)
+        prefetch = _prefetch_tasks.get(offset)
+        if data is not None:
+            logger.info(f"⚡⚡⚡ Cache hit for vacantes offset {offset}")
+        elif prefetch is not None:
+            # The page is already on its way; shield it so a cancelled turn doesn't cancel the shared task
+            logger.info(f"⚡⚡⚡ Waiting on in-flight prefetch for vacantes offset {offset}")
+            data = await asyncio.shield(prefetch)
+        else:
+            logger.info(f"📡📡📡 Making HTTP request to MCP server for offset {offset}")
+            print(f"📡📡📡 HTTP REQUEST to MCP: search_available_vacancies offset={offset}")
+            data = await _fetch_and_cache(offset)
+
         vacantes = data.get("results", [])
         pagination_info = data.get("pagination", {})
 
@@ -78,6 +165,9 @@ def get_available_vacantes(offset: int = 0, tool_context: ToolContext = None) ->
             for vacante in vacantes
         ]
         
+        if pagination_info.get("has_more", data.get("has_more")):
+            _prefetch_page(offset + VACANTES_PAGE_SIZE)
+
         logger.info(f"🎯🎯🎯 Returning {len(formatted_vacantes)} formatted vacantes to agent")
         print(f"🎯🎯🎯 TOOL RETURNING: {len(formatted_vacantes)} vacantes to job_discovery_agent")
         
@@ -87,14 +177,26 @@ def get_available_vacantes(offset: int = 0, tool_context: ToolContext = None) ->
             "pagination": pagination_info
         }
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌❌❌ RequestException in get_available_vacantes: {e}", exc_info=True)
-        print(f"❌❌❌ MCP ERROR: RequestException - {e}")
-        return {"status": "error", "message": f"Error de conexión al obtener las vacantes: {e}"}
-    except json.JSONDecodeError as e:
-        logger.error(f"❌❌❌ JSONDecodeError in get_available_vacantes: {e}", exc_info=True)
+    except orjson.JSONDecodeError as e:
+        logger.warning(f"❌❌❌ JSONDecodeError in get_available_vacantes: {e}")
         print(f"❌❌❌ MCP ERROR: JSONDecodeError - {e}")
         return {"status": "error", "message": f"Error decodificando la respuesta de las vacantes: {e}"}
+    except asyncio.TimeoutError as e:
+        logger.warning(f"❌❌❌ Timeout in get_available_vacantes (offset={offset}): {e}")
+        print(f"❌❌❌ MCP ERROR: Timeout - {e}")
+        return {"status": "error", "message": f"Error de conexión al obtener las vacantes: {e}"}
+    except aiohttp.ClientConnectionError as e:
+        logger.warning(f"❌❌❌ ConnectionError in get_available_vacantes (offset={offset}): {e}")
+        print(f"❌❌❌ MCP ERROR: ConnectionError - {e}")
+        return {"status": "error", "message": f"Error de conexión al obtener las vacantes: {e}"}
+    except aiohttp.ClientResponseError as e:
+        logger.warning(f"❌❌❌ HTTPError in get_available_vacantes (offset={offset}): {e}")
+        print(f"❌❌❌ MCP ERROR: HTTPError - {e}")
+        return {"status": "error", "message": f"Error de conexión al obtener las vacantes: {e}"}
+    except aiohttp.ClientError as e:
+        logger.error(f"❌❌❌ ClientError in get_available_vacantes: {e}", exc_info=True)
+        print(f"❌❌❌ MCP ERROR: ClientError - {e}")
+        return {"status": "error", "message": f"Error de conexión al obtener las vacantes: {e}"}
     except Exception as e:
         logger.error(f"❌❌❌ Generic error in get_available_vacantes: {e}", exc_info=True)
         print(f"❌❌❌ MCP ERROR: Generic exception - {e}")
@@ -128,57 +230,7 @@ job_discovery_agent = Agent(
     name="job_discovery_agent",
     model=INFO_AGENT_MODEL,
     description="Agente para descubrir y seleccionar vacantes.",
-    instruction='''
-    Eres "Chambella", un asistente virtual amigable y profesional para ayudar al usuario a seleccionar una vacante de su interés.
-
-    **REGLA CRÍTICA FUNDAMENTAL:**
-    SIEMPRE, SIN EXCEPCIÓN, debes llamar a la herramienta `get_available_vacantes()` para obtener vacantes frescas del servidor MCP.
-    NUNCA uses información previa o del historial. SIEMPRE consulta el servidor.
-
-    **FLUJO OBLIGATORIO (NO OPCIONAL):**
-    1. **PRIMERA ACCIÓN MANDATORIA:** Llama INMEDIATAMENTE a `get_available_vacantes()` - NO hagas nada más hasta ejecutar esta herramienta
-    2. **ESPERA los resultados** de la herramienta MCP
-    3. **SOLO ENTONCES** presenta las vacantes al usuario
-
-    **INSTRUCCIONES ESPECÍFICAS:**
-
-    **INICIO DE CONVERSACIÓN:**
-    - Tu PRIMERA y ÚNICA acción es: `get_available_vacantes()`
-    - NO respondas con texto hasta que hayas ejecutado la herramienta
-    - NO uses listas hardcodeadas o del historial
-    - SIEMPRE consulta el servidor MCP en tiempo real
-
-    **PRESENTACIÓN DE VACANTES:**
-    - SOLO después de recibir resultados del MCP, presenta:
-      "¡Hola! Te ayudaré a encontrar una vacante. Aquí tienes las vacantes disponibles:
-      1. [Título real del MCP]
-      2. [Título real del MCP]
-      Por favor, dime el número de la vacante que te interesa. (selecciona solo una)"
-
-    **SELECCIÓN DE USUARIO:**
-    - Cuando el usuario elija una vacante con un solo número, llama a `select_job()` con los datos REALES del MCP.
-    - Si el usuario da una respuesta múltiple o confusa (ej: "la 1 y la 2", "dime de todas"), DEBES responder: "Por favor, selecciona un número correspondiente al menu de vacantes. Si quieres ver el menu principal teclea vacantes" y esperar a que elija una sola opción. NO llames a ninguna herramienta hasta que elija un solo número.
-
-    **TRANSFERENCIA DE AGENTE:**
-    - La transferencia al siguiente agente (`job_info_agent`) se realiza AUTOMÁTICAMENTE dentro de la herramienta `select_job`.
-    - Por lo tanto, NO puedes transferir al agente de información hasta que el usuario haya hecho una selección de vacante ÚNICA y VÁLIDA.
-    - Si el usuario no selecciona una opción del menú, DEBES insistir y volver a presentar el menú. NO llames a `select_job` ni intentes transferir.
-
-    **REGLAS ABSOLUTAS:**
-    - JAMÁS inventes o uses vacantes del historial
-    - JAMÁS respondas sin llamar primero a `get_available_vacantes()`
-    - SIEMPRE usa herramientas, NUNCA texto hardcodeado
-    - Si `get_available_vacantes()` falla, reporta el error real
-    - Tu única fuente de verdad es el servidor MCP
-    - El idioma de la conversación es SIEMPRE español.
-
-    **PROHIBIDO:**
-    - Responder sin llamar herramientas
-    - Dar informacion del lugar de la entrevista
-    - Usar listas predefinidas
-    - Hacer suposiciones sobre vacantes disponibles
-    - Responder basado en conversaciones previas
-    ''',
+    instruction=_INSTRUCTION,
     tools=[
         get_available_vacantes,
         select_job,
@@ -1,83 +1,155 @@
 from google.adk.agents import Agent
 from google.adk.tools import transfer_to_agent
 from google.adk.tools.tool_context import ToolContext
+import aiohttp
+import asyncio
 import json
 import logging
 import os
-import requests
-from dotenv import load_dotenv
+import orjson
+from cachetools import TTLCache
 
 # Import centralized config
-from config import INFO_AGENT_MODEL
+from config import INFO_AGENT_MODEL, MCP_SERVER_URL, MCP_CONNECT_TIMEOUT, MCP_READ_TIMEOUT
 
-# Construct path to the parent directory's .env file
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenv_path=dotenv_path, override=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Logging is configured by the host application (main.py)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-MCP_PORT = os.getenv("MCP_PORT")
-if not MCP_PORT:
-    raise RuntimeError("MCP_PORT environment variable is required for MCP_SERVER_URL")
-try:
-    MCP_PORT_INT = int(MCP_PORT)
-except ValueError:
-    raise RuntimeError(f"Invalid MCP_PORT value: {MCP_PORT}")
-MCP_SERVER_URL = f"http://localhost:{MCP_PORT_INT}"
-MCP_CONNECTION_TIMEOUT = int(os.getenv("MCP_CONNECTION_TIMEOUT", "5"))
-
-# def get_job_details_by_id(job_id: str, tool_context: ToolContext = None) -> dict:
-#     """Get detailed information about a specific job by ID using MCP server."""
-#     logger.debug(f"get_job_details_by_id called with ID: {job_id}")
-    
-#     try:
-#         job_id_int = int(job_id)
-#     except ValueError:
-#         logger.error(f"Invalid job_id format: {job_id}. Must be an integer.")
-#         return {"status": "error", "message": "El ID de la vacante no es válido (debe ser un número)."}
-
-#     try:
-#         # Use the exact same call as in mcp_elasticsearch_sse.py
-#         response = requests.post(
-#             f"{MCP_SERVER_URL}/mcp/tool/search_by_id_puesto",
-#             json={"id_puesto": str(job_id_int), "detail_level": "detail"},
-#             timeout=float(MCP_CONNECTION_TIMEOUT)
-#         )
-#         response.raise_for_status()
-        
-#         result_data = response.json()
-        
-#         # Handle error response
-#         if isinstance(result_data, dict) and "error" in result_data:
-#             logger.error(f"MCP server returned error: {result_data['error']}")
-#             return {"status": "error", "message": f"Error al obtener detalles de la vacante: {result_data['error']}"}
-
-#         # The MCP server returns the job details directly (not in a list)
-#         if isinstance(result_data, dict) and "Id_Puesto" in result_data:
-#             logger.info(f"Successfully fetched details for job ID {job_id}")
-#             return {"status": "success", "job_details": result_data}
-#         else:
-#             logger.warning(f"No job details found for ID {job_id}")
-#             return {"status": "error", "message": f"No se encontraron detalles para la vacante con ID {job_id}."}
-        
-#     except requests.exceptions.RequestException as e:
-#         logger.error(f"RequestException for ID {job_id}: {e}", exc_info=True)
-#         return {"status": "error", "message": f"Error de conexión al obtener detalles de la vacante: {e}"}
-#     except json.JSONDecodeError as e:
-#         logger.error(f"JSONDecodeError for ID {job_id}: {e}", exc_info=True)
-#         return {"status": "error", "message": f"Error decodificando los detalles de la vacante: {e}"}
-#     except Exception as e:
-#         logger.error(f"Generic error for ID {job_id}: {e}", exc_info=True)
-#         return {"status": "error", "message": f"Error inesperado al obtener detalles de la vacante: {e}"}
-
-def get_job_details_by_id(job_id: str, tool_context: ToolContext = None) -> dict:
+_MCP_TIMEOUT = aiohttp.ClientTimeout(connect=MCP_CONNECT_TIMEOUT, sock_read=MCP_READ_TIMEOUT)
+
+# Bounded retry for connect failures and gateway errors; read timeouts are not retried
+MCP_MAX_RETRIES = 2
+MCP_RETRY_BACKOFF = 0.2
+MCP_RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Shared aiohttp session for MCP calls, created lazily on the running event loop
+_http_session = None
+_http_session_lock = asyncio.Lock()
+
+
+async def _get_http_session() -> aiohttp.ClientSession:
+    """Return the shared MCP ClientSession, creating it on first use."""
+    global _http_session
+    async with _http_session_lock:
+        if _http_session is None or _http_session.closed:
+            _http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, keepalive_timeout=30)
+            )
+    return _http_session
+
+
+async def close() -> None:
+    """Close the shared MCP ClientSession (awaited from the host's shutdown handler)."""
+    global _http_session
+    async with _http_session_lock:
+        if _http_session is not None and not _http_session.closed:
+            await _http_session.close()
+        _http_session = None
+
+# get_job_details_by_id results keyed by job_id_int; misses expire sooner so new jobs show up
+_job_details_cache = TTLCache(maxsize=1024, ttl=300)
+_job_details_negative_cache = TTLCache(maxsize=1024, ttl=30)
+_job_details_cache_lock = asyncio.Lock()
+
+
+def invalidate(job_id) -> None:
+    """Drop cached details for job_id so the next lookup goes to the MCP server."""
+    try:
+        job_id_int = int(job_id)
+    except (TypeError, ValueError):
+        return
+    _job_details_cache.pop(job_id_int, None)
+    _job_details_negative_cache.pop(job_id_int, None)
+
+
+async def _cache_job_details(job_id_int: int, result: dict) -> dict:
+    cache = _job_details_cache if result.get("status") == "success" else _job_details_negative_cache
+    async with _job_details_cache_lock:
+        cache[job_id_int] = result
+    return result
+
+class McpCallBatcher:
+    """Coalesce MCP tool calls that arrive close together into a single flush.
+
+    Calls are queued per key; the queue is flushed after ``max_wait_ms`` or as soon
+    as ``max_batch_size`` distinct keys are waiting. Each distinct key is fetched once
+    (concurrently, over the shared session) and the result or exception is delivered
+    to every caller waiting on that key.
+    """
+
+    def __init__(self, fetch, max_batch_size: int = 10, max_wait_ms: int = 20):
+        self._fetch = fetch
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._pending = {}
+        self._timer = None
+        self._flush_tasks = set()
+
+    async def submit(self, key):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        if len(self._pending) >= self._max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, batch):
+        keys = list(batch)
+        logger.debug(f"Flushing MCP batch of {len(keys)} key(s): {keys}")
+        results = await asyncio.gather(*(self._fetch(key) for key in keys), return_exceptions=True)
+        for key, result in zip(keys, results):
+            for future in batch[key]:
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+async def _fetch_job_details(job_id_int: int):
+    """POST search_by_id_vacante for one ID and return the decoded response."""
+    session = await _get_http_session()
+    for attempt in range(MCP_MAX_RETRIES + 1):
+        try:
+            async with session.post(
+                f"{MCP_SERVER_URL}/mcp/tool/search_by_id_vacante",
+                json={"id_vacante": str(job_id_int)},
+                timeout=_MCP_TIMEOUT
+            ) as response:
+                # Añadir log de respuesta
+                logger.info(f"Respuesta de search_by_id_vacante: status_code={response.status}")
+                if response.status in MCP_RETRY_STATUSES and attempt < MCP_MAX_RETRIES:
+                    retry_reason = f"HTTP {response.status}"
+                else:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+        except aiohttp.ClientConnectorError as e:
+            if attempt >= MCP_MAX_RETRIES:
+                raise
+            retry_reason = repr(e)
+        delay = MCP_RETRY_BACKOFF * (2 ** attempt)
+        logger.warning(f"search_by_id_vacante for ID {job_id_int} failed ({retry_reason}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+# One request per unique ID per 20 ms window; swap _fetch_job_details for a bulk
+# call if the MCP server ever exposes one (e.g. search_by_ids_vacante).
+_job_details_batcher = McpCallBatcher(_fetch_job_details, max_batch_size=10, max_wait_ms=20)
+
+async def get_job_details_by_id(job_id: str, tool_context: ToolContext = None) -> dict:
     """Get detailed information about a specific job by ID using MCP server."""
     logger.debug(f"get_job_details_by_id called with ID: {job_id}")
     
@@ -87,34 +159,26 @@ def get_job_details_by_id(job_id: str, tool_context: ToolContext = None) -> dict
         logger.error(f"Invalid job_id format: {job_id}. Must be an integer.")
         return {"status": "error", "message": "El ID de la vacante no es válido (debe ser un número)."}
 
+    async with _job_details_cache_lock:
+        cached = _job_details_cache.get(job_id_int) or _job_details_negative_cache.get(job_id_int)
+    if cached is not None:
+        logger.debug(f"get_job_details_by_id cache hit for ID {job_id_int}")
+        return cached
+
     try:
         # Añadir log antes de hacer la llamada
         logger.info(f"Haciendo solicitud a search_by_id_vacante para job_id: {job_id_int}")
         
-        # Use the new search_by_id_vacante tool
-        response = requests.post(
-            f"{MCP_SERVER_URL}/mcp/tool/search_by_id_vacante",
-            json={"id_vacante": str(job_id_int)},
-            timeout=float(MCP_CONNECTION_TIMEOUT)
-        )
-        # Añadir log de respuesta
-        logger.info(f"Respuesta de search_by_id_vacante: status_code={response.status_code}")
-        response.raise_for_status()
-        
-        result_data = response.json()
-        # Añadir log para verificar el contenido completo de la respuesta
-        logger.info(f"Respuesta completa de search_by_id_vacante: {result_data}")
-        logger.info(f"Tipo de respuesta: {type(result_data)}")
-        logger.info(f"Claves en la respuesta: {list(result_data.keys()) if isinstance(result_data, dict) else 'No es dict'}")
-        
-        # Añadir log para verificar el ID devuelto
-        returned_id = result_data.get("id_vacante") if isinstance(result_data, dict) else None
-        logger.info(f"ID devuelto por search_by_id_vacante: {returned_id} (solicitado: {job_id_int})")
-        
+        # Use the new search_by_id_vacante tool (coalesced with concurrent lookups)
+        result_data = await _job_details_batcher.submit(job_id_int)
+        # Full payload only at DEBUG; the ID check below logs the outcome at INFO
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Respuesta completa de search_by_id_vacante: %s", result_data)
+
         # Handle error response
         if isinstance(result_data, dict) and "error" in result_data:
             logger.error(f"MCP server returned error: {result_data['error']}")
-            return {"status": "error", "message": f"Error al obtener detalles de la vacante: {result_data['error']}"}
+            return await _cache_job_details(job_id_int, {"status": "error", "message": f"Error al obtener detalles de la vacante: {result_data['error']}"})
 
         # The MCP server returns the text fields directly
         # Check if we have any fields returned (not just id_vacante)
@@ -128,23 +192,29 @@ def get_job_details_by_id(job_id: str, tool_context: ToolContext = None) -> dict
             else:
                 logger.info(f"Successfully fetched details for job ID {job_id} - no id_vacante field to verify")
             
-            return {"status": "success", "job_details": result_data}
+            return await _cache_job_details(job_id_int, {"status": "success", "job_details": result_data})
         else:
             logger.warning(f"No job details found for ID {job_id}. Result: {result_data}")
-            return {"status": "error", "message": f"No se encontraron detalles para la vacante con ID {job_id}."}
+            return await _cache_job_details(job_id_int, {"status": "error", "message": f"No se encontraron detalles para la vacante con ID {job_id}."})
             
-    except requests.exceptions.RequestException as e:
-        logger.error(f"RequestException for ID {job_id}: {e}", exc_info=True)
-        return {"status": "error", "message": f"Error de conexión al obtener detalles de la vacante: {e}"}
-    except json.JSONDecodeError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"MCP request error for ID {job_id}: {e!r}", exc_info=True)
+        return {"status": "error", "message": f"Error de conexión al obtener detalles de la vacante: {e!r}"}
+    except (orjson.JSONDecodeError, json.JSONDecodeError) as e:
         logger.error(f"JSONDecodeError for ID {job_id}: {e}", exc_info=True)
         return {"status": "error", "message": f"Error decodificando los detalles de la vacante: {e}"}
     except Exception as e:
         logger.error(f"Generic error for ID {job_id}: {e}", exc_info=True)
         return {"status": "error", "message": f"Error inesperado al obtener detalles de la vacante: {e}"}
 
-def load_job_info(tool_context: ToolContext) -> dict:
-    """Load job information from current_job_id in context state."""
+# MCP fields already stored under "id"/"title" in current_job_interest
+_SKIP_KEYS = frozenset({"id_vacante", "nombre_de_la_vacante"})
+
+async def load_job_info(tool_context: ToolContext, force_refresh: bool = False) -> dict:
+    """Load job information from current_job_id in context state.
+
+    :param force_refresh: Ignore the job already loaded in state (and the details cache) and query the MCP server again.
+    """
     logger.debug("load_job_info called")
     
     # Get current_job_id from context state
@@ -154,11 +224,23 @@ def load_job_info(tool_context: ToolContext) -> dict:
     if not current_job_id:
         logger.warning("No current_job_id found in context state")
         return {"status": "error", "message": "No hay ID de vacante en el contexto actual."}
+
+    # Reuse the job loaded on a previous turn when it is still the current one
+    existing = tool_context.state.get("current_job_interest")
+    if force_refresh:
+        invalidate(current_job_id)
+    elif isinstance(existing, dict) and str(existing.get("id")) == str(current_job_id):
+        logger.debug(f"current_job_interest already loaded for job ID {current_job_id}")
+        return {
+            "status": "success",
+            "message": f"Información cargada para la vacante '{existing.get('title', 'Unknown Title')}' (ID: {current_job_id}).",
+            "job_details": existing
+        }
     
     logger.info(f"Loading job info for current_job_id: {current_job_id}")
     
     # Get job details
-    job_details_response = get_job_details_by_id(current_job_id, tool_context)
+    job_details_response = await get_job_details_by_id(current_job_id, tool_context)
     logger.debug(f"Job details response: {job_details_response}")
 
     if job_details_response.get("status") == "success" and job_details_response.get("job_details"):
@@ -168,26 +250,30 @@ def load_job_info(tool_context: ToolContext) -> dict:
         current_interest = {
             "id": str(job_data.get("id_vacante", current_job_id)),
             "title": job_data.get("nombre_de_la_vacante", f"Vacante ID {current_job_id}"),
+            **{key: value for key, value in job_data.items() if key not in _SKIP_KEYS},
         }
         
-        # Add all other fields dynamically from the MCP response
-        for key, value in job_data.items():
-            if key not in ["id_vacante", "nombre_de_la_vacante"]:  # Skip already handled fields
-                current_interest[key] = value
-        
         tool_context.state["current_job_interest"] = current_interest
         
         logger.info(f"Successfully loaded job info for '{current_interest.get('title', 'Unknown Title')}' (ID: {current_job_id})")
         return {
             "status": "success", 
             "message": f"Información cargada para la vacante '{current_interest.get('title', 'Unknown Title')}' (ID: {current_job_id}).",
-            "job_details": job_data
+            # Same normalized shape (id/title) as the already-loaded path above
+            "job_details": current_interest
         }
     else:
         error_msg = job_details_response.get("message", "No se pudieron obtener los detalles.")
         logger.warning(f"Could not load job info for current_job_id: {current_job_id}. Message: {error_msg}")
         return {"status": "error", "message": error_msg}
 
+# Fields required to apply: (result name, state keys checked in order)
+_REQUIRED = (
+    ("user_name", ("user_name",)),
+    ("last_name", ("last_name",)),
+    ("phone_number", ("contact_phone_number", "phone_number")),
+)
+
 def check_user_data(tool_context: ToolContext) -> dict:
     """
     Verifica si los datos necesarios del usuario están presentes en el estado.
@@ -198,56 +284,28 @@ def check_user_data(tool_context: ToolContext) -> dict:
     """
 
     logger.debug("check_user_data called")
-    user_name = tool_context.state.get("user_name", "").strip()
-    last_name = tool_context.state.get("last_name", "").strip()
-    phone_number = tool_context.state.get("contact_phone_number", "").strip()
-    if not phone_number:
-        phone_number = tool_context.state.get("phone_number", "").strip()
-
-    user_name_complete = bool(user_name)
-    last_name_complete = bool(last_name)
-    phone_number_complete = bool(phone_number)
-    all_complete = user_name_complete and last_name_complete and phone_number_complete
-
-    missing_fields = []
-    if not user_name_complete:
-        missing_fields.append("user_name")
-    if not last_name_complete:
-        missing_fields.append("last_name")
-    if not phone_number_complete:
-        missing_fields.append("phone_number")
-
-    # Log the values and decision process (critical info as error)
-    logger.error(f"[CRITICAL DEBUG] check_user_data: user_name='{user_name}', last_name='{last_name}', phone_number='{phone_number}'")
-    logger.error(f"[CRITICAL DEBUG] check_user_data: user_name_complete={user_name_complete}, last_name_complete={last_name_complete}, phone_number_complete={phone_number_complete}")
-    logger.error(f"[CRITICAL DEBUG] check_user_data: missing_fields={missing_fields}")
-
-    if all_complete:
-        next_agent = "application_agent"
-        logger.error("[CRITICAL DEBUG] check_user_data: All fields complete. Transferring to application_agent.")
-    else:
-        next_agent = "contact_agent"
-        logger.error(f"[CRITICAL DEBUG] check_user_data: Missing fields {missing_fields}. Transferring to contact_agent.")
+    state = tool_context.state
+    values = {
+        name: next((value for value in ((state.get(key) or "").strip() for key in keys) if value), "")
+        for name, keys in _REQUIRED
+    }
+    missing_fields = [name for name, value in values.items() if not value]
+    all_complete = not missing_fields
+    next_agent = "application_agent" if all_complete else "contact_agent"
+
+    if missing_fields and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("check_user_data: values=%r, missing_fields=%s -> %s", values, missing_fields, next_agent)
 
-    result = {
+    return {
         "status": "complete" if all_complete else "incomplete",
         "all_complete": all_complete,
-        "user_name_complete": user_name_complete,
-        "last_name_complete": last_name_complete,
-        "phone_number_complete": phone_number_complete,
+        **{f"{name}_complete": bool(value) for name, value in values.items()},
         "missing_fields": missing_fields,
         "next_agent": next_agent
     }
 
-    logger.error(f"[CRITICAL DEBUG] check_user_data result: {result}")
-    return result
-
-# Simplified Job Info Agent
-job_info_agent = Agent(
-    name="job_info_agent",
-    model=INFO_AGENT_MODEL,
-    description="Agente especializado en proporcionar información detallada sobre una vacante específica.",
-        instruction='''
+# Agent instruction, built once at import and shared by every worker forked afterwards
+_INSTRUCTION = '''
     Eres un asistente virtual para información de empleos llamado "Chambella". Hablas en español, conciso, cálido y profesional.
 
     REGLAS OBLIGATORIAS (ORDENADAS Y CLARAS):
@@ -276,96 +334,14 @@ job_info_agent = Agent(
       -> transfer_to_agent("job_discovery_agent").
 
     Comportamiento del modelo: genera UNA respuesta compacta y no repitas valores ya presentados. Si imposible obtener datos, informa y termina con la pregunta final. Al transferir usuarios para postulación, NO añadas preguntas adicionales.
-    ''',
-    # instruction='''
-    # Eres un asistente virtual para información de empleos llamado "Chambella". Hablas en español de manera concisa cálida, amigable y profesional. Tu objetivo es proporcionar información específica sobre la vacante que el usuario está consultando.
-
-    # <user_info>
-    # Vacante de interés actual: {current_job_interest}
-    # Job ID actual: {current_job_id}
-    # </user_info>
-
-    # INSTRUCCIONES PRINCIPALES:
-
-    # 1. **OBLIGATORIO AL INICIAR:**
-    #    - ANTES DE RESPONDER CUALQUIER PREGUNTA, DEBES llamar OBLIGATORIAMENTE a `load_job_info()`
-    #    - Si `load_job_info()` falla, indica que no puedes obtener la información en este momento
-
-    # 2. **DESPUÉS DE CARGAR LA INFORMACIÓN:**
-    #    - En la primera contestación al usuario elabora un resumen sin incluir la empresa, de la información cargada con load_job_info() en texto plano, sin usar formato de markdown, negritas, listas ni viñetas.
-    #    - Responde ÚNICAMENTE lo que se pregunta usando SOLO los datos cargados
-    #    - En las respuestas que des evita repetir información, analiza que vas a responder antes de contestar
-    #    - Sé conciso y directo con calidez
-    #    - No agregues información extra no solicitada
-    #    - No inventes ni asumas información
-    #    - Ejemplos:
-    #      * "¿Cuál es el sueldo?" → Usa Sueldo_Neto_Min y Sueldo_Max de los datos cargados
-    #      * "¿Dónde está ubicado?" → Usa location de los datos cargados
-    #      * "¿Qué empresa es?" → Usa company de los datos cargados
-    #      * "¿Qué experiencia piden?" → Usa experience_level de los datos cargados
-    #      * "¿Dónde es la entrevista?" → Responder: "La entrevista se realiza en: Av. Dr. Gustavo Baz Manzana 020, La Mora, 54090 Tlalnepantla, Méx."
-    #    - **OBLIGATORIO**: DESPUÉS de CUALQUIER respuesta, SIEMPRE pregunta EXACTAMENTE: "¿Hazme una pregunta sobre la vacante o escribe 'quiero postularme' para iniciar el proceso de postulación?"
-
-    # 3. **INFORMACIÓN COMPLETA:**
-    #    - Solo cuando pregunten "cuéntame sobre la vacante" o algo similar, proporciona información completa
-    #    - Usa ÚNICAMENTE los datos obtenidos de `load_job_info()`
-    #    - Formato simple sin iconos:
-       
-    #    Puesto: [título de los datos cargados]
-    #    Empresa: [empresa de los datos cargados]
-    #    Ubicación: [ubicación de los datos cargados]
-    #    Descripción: [descripción de los datos cargados]
-    #    Funciones: [funciones de los datos cargados]
-    #    Responsabilidades: [responsabilidades de los datos cargados]
-    #    Salario: [salary_min a salary_max de los datos cargados o "No especificado"]
-    #    Experiencia requerida: [experience_level de los datos cargados]
-    #    Tipo de empleo: [employment_type de los datos cargados]
-    #    Ubicación de entrevistas: Se compartirá después de completar tu postulación.
-       
-    #    - **OBLIGATORIO**: DESPUÉS de mostrar información completa, pregunta EXACTAMENTE: "¿Hazme una pregunta sobre la vacante o escribe 'quiero postularme' para iniciar el proceso de postulación?"
-
-    # 4. **POSTULACIÓN:**
-    #    - Si el usuario expresa interés en postularse:
-    #      * PRIMERO llamar OBLIGATORIAMENTE a `check_user_data()` para verificar si los datos del usuario están completos
-    #      * USAR los datos devueltos por `check_user_data()` para tomar decisiones
-    #      * Si check_user_data devuelve "all_complete: false": 
-    #        - Responde con "Para postularte necesito que completes tu información personal. Te voy a conectar para que puedas registrar tus datos."
-    #        - Luego llama: `transfer_to_agent(agent_name="contact_agent")`
-    #      * Si check_user_data devuelve "all_complete: true":
-    #        - Responde con "Perfecto, voy a iniciar el proceso de postulación."
-    #        - Luego llama: `transfer_to_agent(agent_name="application_agent")`
-    #      * NUNCA preguntes al usuario si ya ha registrado sus datos, SIEMPRE verifica con check_user_data
-
-    # **REGLA CRÍTICA DE CONSISTENCIA:**
-    # - **SIN EXCEPCIÓN**: Después de CUALQUIER respuesta (individual, completa, sobre sueldo, horario, empresa, etc.), SIEMPRE termina con EXACTAMENTE esta pregunta: "¿Hazme una pregunta sobre la vacante o escribe 'quiero postularme' para iniciar el proceso de postulación?"
-    # - NO uses variaciones como "¿Te gustaría saber algo más o te animas a postularte?" 
-    # - NO uses "¿Te gustaría saber algo más específico o deseas postularte?"
-    # - NO cambies la redacción por ningún motivo
-    # - Mantén la calidez mexicana en la respuesta, pero la pregunta final DEBE ser idéntica siempre
-
-    # REGLAS CRÍTICAS:
-    # - No uses ninguna información de la historia de la conversación ni de otras vacantes. Cada respuesta debe basarse únicamente en los datos obtenidos de `load_job_info()` para la vacante actual. Si detectas cualquier dato que no provenga de `load_job_info()`, ignóralo completamente.
-    # - NUNCA respondas información de la vacante sin haber llamado primero a `load_job_info()`
-    # - NUNCA preguntes al usuario si ya tiene datos registrados, SIEMPRE usa `check_user_data()`
-    # - SIEMPRE usa `check_user_data()` ANTES de decidir si transferir al contact_agent o al application_agent
-    # - SIEMPRE verifica que estás usando datos del trabajo correcto comparando IDs
-    # - Si encuentras inconsistencias entre el ID actual y la información disponible, prioriza obtener información fresca con `load_job_info()`
-    # - NO inventes datos - usa SOLO la información real cargada
-    # - NO uses iconos ni emojis
-    # - Responde SOLO lo que se pregunta
-    # - Mantén respuestas breves y específicas con calidez mexicana
-    # - Si preguntan sobre un telefono o un numero de contacto directo responde que puede llamar a: "5511289627"
-    # - Para preguntas sobre ubicación de entrevistas, SIEMPRE responder: "La entrevista se realiza en: Av. Dr. Gustavo Baz Manzana 020, La Mora, 54090 Tlalnepantla, Méx."
-    # - **OBLIGATORIO**: SIEMPRE pregunta EXACTAMENTE: "¿Hazme una pregunta sobre la vacante o escribe 'quiero postularme' para iniciar el proceso de postulación?" después de cada respuesta
-
-    # FLUJO OBLIGATORIO:
-    # 0. Si el usuario inicia la conversacion con vacantes o algo que no sea una pregunta directa sobre la vacante llama: `transfer_to_agent(agent_name="job_discovery_agent")`
-    # 1. Usuario hace pregunta
-    # 2. TÚ llamas a `load_job_info()`
-    # 3. TÚ respondes con los datos reales cargados + calidez mexicana
-    # 4. TÚ preguntas EXACTAMENTE: "¿Hazme una pregunta sobre la vacante o escribe 'quiero postularme' para iniciar el proceso de postulación?"
-    # 5. Si quiere postularse, TÚ llamas a `check_user_data()` y decides basado en el resultado
-    # ''',
+    '''
+
+# Simplified Job Info Agent
+job_info_agent = Agent(
+    name="job_info_agent",
+    model=INFO_AGENT_MODEL,
+    description="Agente especializado en proporcionar información detallada sobre una vacante específica.",
+    instruction=_INSTRUCTION,
     tools=[
         load_job_info,
         get_job_details_by_id,
@@ -1,5 +1,7 @@
 from opensearchpy import OpenSearch
+from opensearchpy.helpers import scan
 import json
+import sys
 import warnings
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -11,38 +13,38 @@ es = OpenSearch(
     hosts=[{"host": "opensearch.madd.com.mx", "port": 9200}],
     http_auth=("admin", "GPSc0ntr0l1"),
     use_ssl=True,
-    verify_certs=False
+    verify_certs=False,
+    http_compress=True,
 )
 
-# Consulta (igual a tu GET)
+# Solo traer el campo que se lista; scan pagina con scroll para no truncar en 1000
 search_query = {
-    "size": 1000,
-    "query": {"match_all": {}}
+    "query": {"match_all": {}},
+    "_source": ["nombre_de_la_vacante"]
 }
 
+# --json imprime la lista completa en JSON en lugar de la tabla
+as_json = "--json" in sys.argv[1:]
+
 try:
-    # Ejecutar búsqueda
-    response = es.search(index="vacantefinal", body=search_query)
-    hits = response["hits"]["hits"]
-    print(f"Total de documentos encontrados: {len(hits)}")
-    
-    # Listar _id y nombre_de_la_vacante
-    result = []
-    for hit in hits:
-        doc_id = hit["_id"]
-        nombre = hit["_source"].get("nombre_de_la_vacante", "N/A")
-        result.append({"_id": doc_id, "nombre_de_la_vacante": nombre})
-    
-    # Imprimir como JSON
-    print("\nLista completa (JSON):")
-    print(json.dumps(result, indent=2))
-    
-    # Imprimir como tabla simple
-    print("\nTabla:")
-    print("| # | _id                          | nombre_de_la_vacante                  |")
-    print("|---|------------------------------|---------------------------------------|")
-    for i, item in enumerate(result, 1):
-        print(f"| {i} | {item['_id']:<28} | {item['nombre_de_la_vacante']:<39} |")
-    
+    hits = scan(es, index="vacantefinal", query=search_query, size=500)
+
+    if as_json:
+        result = [
+            {"_id": hit["_id"], "nombre_de_la_vacante": hit["_source"].get("nombre_de_la_vacante", "N/A")}
+            for hit in hits
+        ]
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print(f"Total de documentos encontrados: {len(result)}")
+    else:
+        # Imprimir como tabla simple, fila por fila conforme llegan
+        print("| # | _id                          | nombre_de_la_vacante                  |")
+        print("|---|------------------------------|---------------------------------------|")
+        total = 0
+        for total, hit in enumerate(hits, 1):
+            nombre = hit["_source"].get("nombre_de_la_vacante", "N/A")
+            print(f"| {total} | {hit['_id']:<28} | {nombre:<39} |")
+        print(f"\nTotal de documentos encontrados: {total}")
+
 except Exception as e:
     print(f"Error: {str(e)}")
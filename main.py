@@ -1,32 +1,58 @@
 # Import necessary libraries from all original files
 import asyncio
 import os
+import contextlib
+import functools
+import importlib.util
+import hashlib
 import json
-from flask import Flask, request, jsonify, render_template, send_from_directory
+import msgspec
+import orjson
+import types
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
 import logging
 from dotenv import load_dotenv
+
+# Load environment variables from .env first, so LOG_LEVEL (and the agents' config) see them
+load_dotenv(override=True)
+
+# Configure logging before importing the agents, so their module loggers inherit it.
+# INFO by default; DEBUG (full payloads, webhook bodies, user data) is opt-in via LOG_LEVEL.
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").strip().upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
 from google.adk.runners import Runner
 from google.adk.sessions import DatabaseSessionService
 from job_assistant_agent.agent import job_assistant_agent
-from utils import add_user_query_to_history, call_agent_async, configure_llm_logging, parse_verbosity_args
-from asgiref.wsgi import WsgiToAsgi
+from job_assistant_agent.sub_agents.job_discovery_agent.agent import close as close_job_discovery_session
+from job_assistant_agent.sub_agents.job_info_agent.agent import close as close_job_info_session
+from utils import add_user_query_to_history, call_agent_async, configure_llm_logging, delete_interaction_log, flush_history_loop, flush_pending_history, parse_verbosity_args
 import uvicorn
 import signal
 import sys
 import aiohttp  # Use aiohttp for async requests
 import time
 import sqlite3
+import threading
+import weakref
+from cachetools import LRUCache, TTLCache
 import json
 import random
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
+from sqlalchemy import event
 import urllib.parse # ADDED: For parsing referral links
 
 # Parse verbosity level from command line FIRST
 VERBOSE_LEVEL = parse_verbosity_args()
 
-# Load environment variables from .env and strip spaces if present
-load_dotenv(override=True)
+# Read environment variables (loaded above), stripping spaces if present
 def get_env_var(key, default=None):
     value = os.getenv(key, default)
     if value is not None:
@@ -36,13 +62,6 @@ def get_env_var(key, default=None):
 # Set up logging configuration with parsed verbosity level
 configure_llm_logging(VERBOSE_LEVEL)
 
-# Configure logging
-logging.basicConfig(
-    #level=logging.INFO,
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger(__name__)
 
 # ADDED: helper to mark critical debug logs when --v 3
@@ -52,23 +71,41 @@ def log_critical_debug(message: str):
     else:
         logger.debug(message)
 
-# ADDED: single-line JSON helper for grep-friendly logs
-def log_critical_debug_json(obj, prefix: str = ""):
+# ===== PART 1: Initialize Persistent Session Service =====
+DB_PATH = "./chambella_agent_data.db"
+db_url = f"sqlite:///{DB_PATH}"
+
+# Applied to every SQLite connection: WAL lets the dashboard read while the
+# webhooks write, and the larger cache/mmap keep the sessions+events scan in memory.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+def apply_sqlite_pragmas(dbapi_conn):
+    cursor = dbapi_conn.cursor()
     try:
-        msg = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
-    except Exception as e:
-        msg = f"<<non-serializable: {e}>>"
-    if prefix:
-        log_critical_debug(f"{prefix}: {msg}")
-    else:
-        log_critical_debug(msg)
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
 
-# ===== PART 1: Initialize Persistent Session Service =====
-db_url = "sqlite:///./chambella_agent_data.db"
 session_service = DatabaseSessionService(
     db_url=db_url,
 )
 
+# ADK builds its own SQLAlchemy engine; hook its connect event and drop any
+# connection opened during init so the pool only hands out tuned connections.
+_db_engine = getattr(session_service, "db_engine", None)
+if _db_engine is not None:
+    event.listen(_db_engine, "connect", lambda dbapi_conn, _record: apply_sqlite_pragmas(dbapi_conn))
+    _db_engine.dispose()
+else:
+    logger.warning("DatabaseSessionService has no db_engine attribute; SQLite PRAGMAs not applied to ADK connections.")
+
 # ===== PART 2: Initialize Runner & Agents =====
 runner = Runner(
     agent=job_assistant_agent,
@@ -99,14 +136,12 @@ initial_state = {
 
 
 # ===== PART 4: Async Server Functions =====
-app = Flask(__name__)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+app = FastAPI()
+templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
-# Add this route to serve static files (like logos)
-@app.route('/static/<path:path>')
-def send_static(path):
-    return send_from_directory('static', path)
-
-asgi_app = WsgiToAsgi(app)
+# Serve static files (like logos)
+app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 
 # Environment variables for Meta APIs
 VERIFY_TOKEN = get_env_var("VERIFY_TOKEN", "GPSc0ntr0l1")
@@ -123,35 +158,191 @@ DELETE_PASSWORD = get_env_var("DELETE_PASSWORD", "GPSc0ntr0l1")
 
 # Log environment variables on startup
 # WARNING: Logging raw tokens can expose secrets in logs. Remove or mask in production.
-logger.info(
-    "Loaded environment variables:\n"
-    f"VERIFY_TOKEN={VERIFY_TOKEN}\n"
-    f"MESSENGER_PAGE_ACCESS_TOKEN={MESSENGER_PAGE_ACCESS_TOKEN}\n"
-    f"\n"
-    f"WHATSAPP_ACCESS_TOKEN={WHATSAPP_ACCESS_TOKEN}\n"
-    f"WHATSAPP_PHONE_NUMBER_ID={WHATSAPP_PHONE_NUMBER_ID}\n"
-    f"TELEGRAM_BOT_TOKEN={'***' if TELEGRAM_BOT_TOKEN else 'None'}\n"
-    f"TELEGRAM_ERROR_CHAT_ID={TELEGRAM_ERROR_CHAT_ID}"
-)
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug(
+        "Loaded environment variables:\n"
+        f"VERIFY_TOKEN={VERIFY_TOKEN}\n"
+        f"MESSENGER_PAGE_ACCESS_TOKEN={MESSENGER_PAGE_ACCESS_TOKEN}\n"
+        f"\n"
+        f"WHATSAPP_ACCESS_TOKEN={WHATSAPP_ACCESS_TOKEN}\n"
+        f"WHATSAPP_PHONE_NUMBER_ID={WHATSAPP_PHONE_NUMBER_ID}\n"
+        f"TELEGRAM_BOT_TOKEN={'***' if TELEGRAM_BOT_TOKEN else 'None'}\n"
+        f"TELEGRAM_ERROR_CHAT_ID={TELEGRAM_ERROR_CHAT_ID}"
+    )
+
+
+# Shared outbound HTTP session (Meta Graph API, Telegram, local MCP tools).
+# Created lazily on the serving event loop and closed in shutdown_handler.
+HTTP_TIMEOUT_15 = aiohttp.ClientTimeout(total=15)
+HTTP_TIMEOUT_10 = aiohttp.ClientTimeout(total=10)
+_http_session = None
+_http_session_lock = asyncio.Lock()
+
+# Outbound endpoints and headers are fixed once the environment is loaded
+_WA_URL = f"https://graph.facebook.com/v22.0/{WHATSAPP_PHONE_NUMBER_ID}/messages"
+_WA_HEADERS = {
+    "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
+    "Content-Type": "application/json"
+}
+_WA_PAYLOAD_BASE = {"messaging_product": "whatsapp", "type": "text"}
+_FB_URL = "https://graph.facebook.com/v22.0/me/messages"
+_FB_PARAMS = {"access_token": MESSENGER_PAGE_ACCESS_TOKEN}
+_TG_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+
+
+def _orjson_dumps(obj) -> str:
+    # aiohttp's json_serialize must return str
+    return orjson.dumps(obj).decode()
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Return the process-wide aiohttp session, creating it on first use."""
+    global _http_session
+    async with _http_session_lock:
+        if _http_session is None or _http_session.closed:
+            _http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=75),
+                raise_for_status=False,
+                json_serialize=_orjson_dumps,
+            )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+class OutboundBatcher:
+    """Coalesce outbound sends that arrive close together into one burst.
+
+    Sends are queued and flushed after ``max_wait_ms`` or as soon as
+    ``max_batch_size`` are waiting; a flush posts the whole batch concurrently
+    over the shared session and hands each caller its own result.
+    """
+
+    def __init__(self, send, max_batch_size: int = 20, max_wait_ms: int = 20):
+        self._send = send
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._flush_tasks = set()
+
+    async def submit(self, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((args, future))
+        if len(self._pending) >= self._max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_wait, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, batch):
+        logger.debug(f"Flushing {len(batch)} outbound message(s) via {self._send.__name__}")
+        results = await asyncio.gather(*(self._send(*args) for args, _ in batch), return_exceptions=True)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
 
 # Telegram error notification function
-async def send_telegram_error_alert(phone_number: str, error_message: str, channel: str = "whatsapp") -> bool:
-    """Send error alert to Telegram when WhatsApp/Messenger message fails."""
+# Upper bound on how much of an error response body is logged or forwarded
+ERROR_BODY_LOG_LIMIT = 2048
+
+
+def truncate_body(body: bytes) -> str:
+    text = body[:ERROR_BODY_LOG_LIMIT].decode("utf-8", "replace")
+    if len(body) > ERROR_BODY_LOG_LIMIT:
+        text += f"... [{len(body) - ERROR_BODY_LOG_LIMIT} more bytes]"
+    return text
+
+
+# Alerts are queued and posted by a background task so a slow or failing Telegram
+# never adds latency to the Meta send path. Alerts with the same (channel, dedup key)
+# within ALERT_DEDUP_TTL seconds are dropped, and the queue is bounded to cap alert storms.
+ALERT_QUEUE_SIZE = 1000
+ALERT_BATCH_SIZE = 20
+ALERT_DEDUP_TTL = 60
+_alert_queue = asyncio.Queue(maxsize=ALERT_QUEUE_SIZE)
+_recent_alerts = TTLCache(maxsize=512, ttl=ALERT_DEDUP_TTL)
+_alert_drain_task = None
+
+
+def meta_error_signature(status: int, body: bytes) -> str:
+    """Identify a Graph API failure by status and error code/subcode/type.
+
+    The raw body can't be used for de-duplication: it carries a per-request fbtrace_id.
+    """
+    try:
+        error = orjson.loads(body).get("error") or {}
+    except (orjson.JSONDecodeError, AttributeError):
+        error = {}
+    return f"{status}:{error.get('code')}:{error.get('error_subcode')}:{error.get('type')}"
+
+
+def send_telegram_error_alert(phone_number: str, error_message: str, channel: str = "whatsapp", dedup_key: str = None) -> bool:
+    """Queue an error alert for Telegram when a WhatsApp/Messenger message fails.
+
+    Alerts are de-duplicated on ``dedup_key`` (default: the error message).
+    Returns True if the alert was queued, False if it was a duplicate or the queue is full.
+    """
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_ERROR_CHAT_ID:
         logger.warning("Telegram configuration not set. Cannot send error alert.")
         return False
-    
+
+    alert_key = hashlib.sha1(f"{channel}\x00{dedup_key or error_message}".encode("utf-8")).hexdigest()
+    if alert_key in _recent_alerts:
+        logger.debug(f"Suppressing duplicate Telegram alert for {channel}: {error_message}")
+        return False
+    try:
+        _alert_queue.put_nowait((phone_number, error_message, channel, datetime.now()))
+    except asyncio.QueueFull:
+        logger.warning("Telegram alert queue is full; dropping alert.")
+        return False
+    _recent_alerts[alert_key] = True
+    return True
+
+
+async def drain_telegram_alerts():
+    """Background task: post queued alerts to Telegram, a burst at a time."""
+    while True:
+        batch = [await _alert_queue.get()]
+        while len(batch) < ALERT_BATCH_SIZE and not _alert_queue.empty():
+            batch.append(_alert_queue.get_nowait())
+        try:
+            await asyncio.gather(*(_post_telegram_alert(*alert) for alert in batch))
+        finally:
+            for _ in batch:
+                _alert_queue.task_done()
+
+
+async def _post_telegram_alert(phone_number: str, error_message: str, channel: str, occurred_at: datetime) -> bool:
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        
         # Format the error message
         alert_message = (
             f"🚨 *ERROR EN CHAMBELLA*\n\n"
             f"*Canal:* {channel.upper()}\n"
             f"*Teléfono:* {phone_number}\n"
             f"*Error:* {error_message}\n"
-            f"*Timestamp:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            f"*Timestamp:* {occurred_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
             f"Por favor revisar la configuración del servidor."
         )
         
@@ -161,12 +352,14 @@ async def send_telegram_error_alert(phone_number: str, error_message: str, chann
             'parse_mode': 'Markdown'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=10) as response:
-                response.raise_for_status()
-                response_json = await response.json()
-                logger.info(f"Telegram error alert sent successfully: {response_json}")
-                return True
+        session = await get_http_session()
+        async with session.post(_TG_URL, json=payload, timeout=HTTP_TIMEOUT_10) as response:
+            body = await response.read()
+            if response.status != 200:
+                logger.error(f"Telegram API error {response.status}: {truncate_body(body)}")
+                return False
+            logger.info(f"Telegram error alert sent successfully: {orjson.loads(body) if body else {}}")
+            return True
                 
     except Exception as e:
         logger.error(f"Failed to send Telegram error alert: {e}")
@@ -177,9 +370,9 @@ async def send_telegram_error_alert(phone_number: str, error_message: str, chann
 async def send_message_async(channel: str, recipient_id: str, message: str) -> bool:
     """Dispatches the message to the correct platform based on the channel."""
     if channel == 'whatsapp':
-        return await send_whatsapp_message(recipient_id, message)
+        return await _wa_batcher.submit(recipient_id, message)
     elif channel == 'messenger':
-        return await send_facebook_message(recipient_id, message)
+        return await _fb_batcher.submit(recipient_id, message)
     else:
         logger.error(f"Unsupported channel: {channel}")
         return False
@@ -190,45 +383,35 @@ async def send_whatsapp_message(recipient_id: str, message: str) -> bool:
     if not WHATSAPP_ACCESS_TOKEN or not WHATSAPP_PHONE_NUMBER_ID:
         error_msg = "WhatsApp environment variables are not set."
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
+        send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
         return False
     
-    url = f"https://graph.facebook.com/v22.0/{WHATSAPP_PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": recipient_id,
-        "type": "text",
-        "text": {"body": message},
-    }
+    payload = {**_WA_PAYLOAD_BASE, "to": recipient_id, "text": {"body": message}}
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload, timeout=15) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    response_json = await response.json() if response_text else {}
-                    logger.info(f"WhatsApp message sent to {recipient_id}: {response_json}")
-                    return True
-                else:
-                    error_msg = f"WhatsApp API error {response.status}: {response_text}"
-                    logger.error(error_msg)
-                    await send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
-                    return False
+        session = await get_http_session()
+        async with session.post(_WA_URL, headers=_WA_HEADERS, json=payload, timeout=HTTP_TIMEOUT_15) as response:
+            body = await response.read()
+
+            if response.status == 200:
+                response_json = orjson.loads(body) if body else {}
+                logger.info(f"WhatsApp message sent to {recipient_id}: {response_json}")
+                return True
+            else:
+                error_msg = f"WhatsApp API error {response.status}: {truncate_body(body)}"
+                logger.error(error_msg)
+                send_telegram_error_alert(recipient_id, error_msg, "whatsapp", dedup_key=meta_error_signature(response.status, body))
+                return False
                     
     except aiohttp.ClientError as e:
         error_msg = f"WhatsApp network error: {str(e)}"
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
+        send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
         return False
     except Exception as e:
         error_msg = f"WhatsApp unexpected error: {str(e)}"
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
+        send_telegram_error_alert(recipient_id, error_msg, "whatsapp")
         return False
 
 # Facebook Messenger-specific message sending (Corrected with aiohttp)
@@ -237,55 +420,89 @@ async def send_facebook_message(recipient_id: str, message: str) -> bool:
     if not MESSENGER_PAGE_ACCESS_TOKEN:
         error_msg = "Messenger page access token is not set."
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "messenger")
+        send_telegram_error_alert(recipient_id, error_msg, "messenger")
         return False
     
-    params = {"access_token": MESSENGER_PAGE_ACCESS_TOKEN}
     payload = {"recipient": {"id": recipient_id}, "message": {"text": message}}
-    url = "https://graph.facebook.com/v22.0/me/messages"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, params=params, json=payload, timeout=15) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    response_json = await response.json() if response_text else {}
-                    logger.info(f"Messenger message sent to {recipient_id}: {response_json}")
-                    return True
-                else:
-                    error_msg = f"Messenger API error {response.status}: {response_text}"
-                    logger.error(error_msg)
-                    await send_telegram_error_alert(recipient_id, error_msg, "messenger")
-                    return False
+        session = await get_http_session()
+        async with session.post(_FB_URL, params=_FB_PARAMS, json=payload, timeout=HTTP_TIMEOUT_15) as response:
+            body = await response.read()
+
+            if response.status == 200:
+                response_json = orjson.loads(body) if body else {}
+                logger.info(f"Messenger message sent to {recipient_id}: {response_json}")
+                return True
+            else:
+                error_msg = f"Messenger API error {response.status}: {truncate_body(body)}"
+                logger.error(error_msg)
+                send_telegram_error_alert(recipient_id, error_msg, "messenger", dedup_key=meta_error_signature(response.status, body))
+                return False
                     
     except aiohttp.ClientError as e:
         error_msg = f"Messenger network error: {str(e)}"
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "messenger")
+        send_telegram_error_alert(recipient_id, error_msg, "messenger")
         return False
     except Exception as e:
         error_msg = f"Messenger unexpected error: {str(e)}"
         logger.error(error_msg)
-        await send_telegram_error_alert(recipient_id, error_msg, "messenger")
+        send_telegram_error_alert(recipient_id, error_msg, "messenger")
         return False
 
+# Strong references to fire-and-forget tasks so they are not garbage-collected mid-flight
+_background_tasks = set()
+
+def fire_and_forget(coro):
+    """Schedule ``coro`` without awaiting it; failures are logged by the coroutine itself."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# One batcher per outbound channel
+_wa_batcher = OutboundBatcher(send_whatsapp_message)
+_fb_batcher = OutboundBatcher(send_facebook_message)
+
 # ===== START: ADDED AD_ID AND REFERRAL HANDLING LOGIC =====
 
+# This assumes a local tool is running, as in the old file.
+_AD_SEARCH_URL = f"http://localhost:{get_env_var('MCP_PORT', '8000')}/mcp/tool/search_by_ad_id"
+
+# Meta re-delivers referrals and users re-click the same ad, so lookups are cached
+# per ad_id/ref. Misses and failures ({}) are kept briefly so a flaky tool recovers fast.
+_ad_search_cache = TTLCache(maxsize=4096, ttl=300)
+_ad_search_negative_cache = TTLCache(maxsize=4096, ttl=30)
+
+
 async def search_by_ad_id(ad_id: str) -> dict:
     """Calls an external tool to find job info by ad_id using aiohttp."""
-    # This function assumes a local tool is running, as in the old file. 
-    mcp_port = get_env_var("MCP_PORT", "8000")
-    url = f"http://localhost:{mcp_port}/mcp/tool/search_by_ad_id"
+    cached = _ad_search_cache.get(ad_id)
+    if cached is None:
+        cached = _ad_search_negative_cache.get(ad_id)
+    if cached is not None:
+        logger.debug(f"search_by_ad_id cache hit for ad_id: {ad_id}")
+        return cached
+
+    result = await _fetch_ad_search(ad_id)
+    if result:
+        _ad_search_cache[ad_id] = result
+    else:
+        _ad_search_negative_cache[ad_id] = result
+    return result
+
+
+async def _fetch_ad_search(ad_id: str) -> dict:
     payload = {"ad_id": ad_id, "detail_level": "summary"}
     logger.info(f"Calling external tool to search for ad_id: {ad_id}")
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=10) as response:
-                response.raise_for_status()
-                result = await response.json()
-                logger.info(f"Tool search_by_ad_id returned: {json.dumps(result)}")
-                return result
+        session = await get_http_session()
+        async with session.post(_AD_SEARCH_URL, json=payload, timeout=HTTP_TIMEOUT_10) as response:
+            response.raise_for_status()
+            result = orjson.loads(await response.read())
+            logger.info(f"Tool search_by_ad_id returned: {result}")
+            return result or {}
     except aiohttp.ClientError as e:
         logger.error(f"Error calling search_by_ad_id tool: {e}")
         return {}
@@ -294,29 +511,88 @@ async def search_by_ad_id(ad_id: str) -> dict:
         return {}
 
 
+# Per-user lock held for a whole inbound event (referral update, history, agent turn,
+# reply), so one user's messages run one at a time and in arrival order, plus
+# user_id -> latest session_id to skip list_sessions.
+# Locks live only while some task holds or waits on them (weak values), so the map
+# doesn't grow with every phone number seen. The id cache is per worker; entries are
+# dropped on delete or when the runner reports the session gone, and expire after 5 minutes.
+_user_locks = weakref.WeakValueDictionary()
+_user_session_cache = TTLCache(maxsize=10_000, ttl=300)
+
+def user_lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+async def run_for_user(user_id: str, handler):
+    """Await an inbound-event handler under the user's lock.
+
+    Webhook tasks reach the lock in arrival order and asyncio.Lock wakes waiters
+    FIFO, so a user's turns never overlap on the ADK session. Only the agent call
+    inside process_message overlaps across different users.
+    """
+    async with user_lock(user_id):
+        await handler
+
+
+def lookup_session_id(app_name: str, user_id: str):
+    """Return the user's latest session id (cached), or None if they have no session.
+
+    A cached id is not re-checked here; process_message evicts it when the runner
+    reports the session gone, and update_session_with_job_info checks it with
+    stored_session_state.
+    """
+    session_id = _user_session_cache.get(user_id)
+    if session_id is None:
+        existing_sessions = session_service.list_sessions(app_name=app_name, user_id=user_id)
+        if existing_sessions and len(existing_sessions.sessions) > 0:
+            session_id = existing_sessions.sessions[0].id
+            _user_session_cache[user_id] = session_id
+    return session_id
+
+
+def stored_session_state(app_name: str, user_id: str, session_id: str):
+    """Session state read straight from the sessions table, or None if the session is gone.
+
+    Unlike session_service.get_session this doesn't load and unpickle the event rows.
+    """
+    row = _get_conn().execute(
+        "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+        (app_name, user_id, session_id),
+    ).fetchone()
+    if row is None:
+        return None
+    return orjson.loads(row['state']) if row['state'] else {}
+
+
 async def update_session_with_job_info(user_id: str, channel: str, job_id, job_title: str, ad_id_or_ref: str = None):
     """
     Updates session state with job info. If the job has changed, it
     deletes the old session and starts a fresh one to avoid context mix-ups.
+    The caller holds the user's lock (see run_for_user).
     """
     APP_NAME = "Jobs Support"
     should_reset_session = False
-    
-    # Correct WhatsApp number format before checking session
-    if channel == 'whatsapp' and user_id.startswith('521'):
-        user_id = user_id.replace('521', '52', 1)
 
-    existing_sessions = session_service.list_sessions(app_name=APP_NAME, user_id=user_id)
-    
-    if existing_sessions and len(existing_sessions.sessions) > 0:
-        session_id = existing_sessions.sessions[0].id
-        session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-        current_job_id = session.state.get("current_job_id")
-        
+    session_id = lookup_session_id(APP_NAME, user_id)
+    state = stored_session_state(APP_NAME, user_id, session_id) if session_id else None
+    if session_id and state is None:
+        # Stale cache entry (session removed elsewhere); look it up again
+        _user_session_cache.pop(user_id, None)
+        session_id = lookup_session_id(APP_NAME, user_id)
+        state = stored_session_state(APP_NAME, user_id, session_id) if session_id else None
+
+    if state is not None:
+        current_job_id = state.get("current_job_id")
+
         # If the new job_id is different from the one in the session, flag for reset
         if job_id and current_job_id and str(job_id) != str(current_job_id):
             logger.info(f"Job ID changed from {current_job_id} to {job_id}. Resetting session for user {user_id}.")
             session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            _user_session_cache.pop(user_id, None)
+            delete_interaction_log(user_id)
             should_reset_session = True
         else:
             logger.info(f"Job ID ({job_id}) has not changed. Continuing existing session {session_id}.")
@@ -337,180 +613,231 @@ async def update_session_with_job_info(user_id: str, channel: str, job_id, job_t
         # If it's a new session from WhatsApp, also set the contact phone number
         if channel == 'whatsapp':
             new_state["contact_phone_number"] = user_id
-            
+        
         new_session = session_service.create_session(app_name=APP_NAME, user_id=user_id, state=new_state)
+        _user_session_cache[user_id] = new_session.id
         logger.info(f"Created new fresh session {new_session.id} for user {user_id} with job {job_id}.")
 
 # ===== END: ADDED AD_ID AND REFERRAL HANDLING LOGIC =====
-@app.route('/favicon.ico')
-def favicon():
-    return send_from_directory(
-        os.path.join(app.root_path, 'static'),
-        'favicon.ico',
-        mimetype='image/vnd.microsoft.icon'
+@app.get('/favicon.ico', include_in_schema=False)
+async def favicon():
+    return FileResponse(
+        os.path.join(BASE_DIR, 'static', 'favicon.ico'),
+        media_type='image/vnd.microsoft.icon'
     )
 
+def verify_webhook(request: Request, platform: str):
+    """Answers Meta's hub.challenge handshake for a webhook subscription."""
+    mode = request.query_params.get("hub.mode")
+    token = request.query_params.get("hub.verify_token")
+    challenge = request.query_params.get("hub.challenge")
+    if mode and token and mode == "subscribe" and token == VERIFY_TOKEN:
+        logger.info(f"{platform} webhook verified.")
+        return PlainTextResponse(challenge or "", status_code=200)
+    else:
+        logger.warning(f"{platform} verification failed.")
+        return PlainTextResponse(f"{platform} verification failed.", status_code=403)
+
 # Unified webhook handlers for both platforms
-@app.route("/webhook-messenger", methods=["GET", "POST"])
-async def webhook_messenger():
+@app.get("/webhook-messenger")
+async def verify_messenger(request: Request):
+    return verify_webhook(request, "Messenger")
+
+# Typed views of the Meta webhook payloads; fields we don't read are skipped by the decoder.
+class FBSender(msgspec.Struct):
+    id: str | None = None
+
+class FBMessage(msgspec.Struct):
+    text: str = ""
+
+class FBMessagingEvent(msgspec.Struct):
+    sender: FBSender | None = None
+    message: FBMessage | None = None
+    referral: dict | None = None
+
+class FBEntry(msgspec.Struct):
+    messaging: list[FBMessagingEvent] = msgspec.field(default_factory=list)
+
+class FBWebhook(msgspec.Struct):
+    entry: list[FBEntry] = msgspec.field(default_factory=list)
+
+class WAText(msgspec.Struct):
+    body: str = ""
+
+class WAMessage(msgspec.Struct):
+    from_: str = msgspec.field(name="from")
+    text: WAText | None = None
+    referral: dict | None = None
+
+class WAValue(msgspec.Struct):
+    messages: list[WAMessage] = msgspec.field(default_factory=list)
+
+class WAChange(msgspec.Struct):
+    value: WAValue = msgspec.field(default_factory=WAValue)
+
+class WAEntry(msgspec.Struct):
+    changes: list[WAChange] = msgspec.field(default_factory=list)
+
+class WAWebhook(msgspec.Struct):
+    entry: list[WAEntry] = msgspec.field(default_factory=list)
+
+_fb_decoder = msgspec.json.Decoder(FBWebhook)
+_wa_decoder = msgspec.json.Decoder(WAWebhook)
+
+async def handle_messenger_event(messaging_event: FBMessagingEvent):
+    """Processes one Messenger messaging event in the background."""
+    sender_id = messaging_event.sender.id
+    try:
+        message_text = messaging_event.message.text if messaging_event.message else ""
+        referral_data = messaging_event.referral
+
+        job_info_from_referral = None
+        search_value = None
+
+        if referral_data:
+            logger.info(f"Referral data found for {sender_id}: {referral_data}")
+            if referral_data.get('source') == 'ADS' and 'ad_id' in referral_data:
+                search_value = referral_data['ad_id']
+            elif 'ref' in referral_data:
+                search_value = referral_data['ref']
+
+            if search_value:
+                job_info_from_referral = await search_by_ad_id(search_value)
+
+        # ACTUALIZAR SESIÓN SI SE ENCONTRÓ INFO DE VACANTE
+        if job_info_from_referral and job_info_from_referral.get('Id_Vacante'):
+            job_id = job_info_from_referral.get('Id_Vacante')  # Cambio: usar Id_Vacante en vez de Id_Puesto
+            job_title = job_info_from_referral.get('Nombre_de_la_vacante') or job_info_from_referral.get('Puesto')
+
+            await update_session_with_job_info(
+                user_id=sender_id,
+                channel="messenger",
+                job_id=job_id,  # Guardará 42 como current_job_id
+                job_title=job_title,  # "Operador de camioneta"
+                ad_id_or_ref=search_value  # "120228908704830333" como current_ad_id
+            )
+
+            # OPCIONAL: Enviar mensaje de bienvenida si no hay texto
+            if not message_text:
+                welcome_message = f"¡Hola! Veo que estás interesado en el puesto de {job_title}. ¿En qué puedo ayudarte?"
+                await send_message_async("messenger", sender_id, welcome_message)
+
+        # PROCESAR MENSAJE DE TEXTO SI EXISTE
+        if message_text:
+            await process_message(
+                sender_id=sender_id,
+                user_query=message_text,
+                channel="messenger",
+            )
+        else:
+            logger.info(f"Processed referral for {sender_id}, no text message to process.")
+    except Exception as e:
+        logger.error(f"Error handling Messenger event for {sender_id}: {e}", exc_info=True)
+
+@app.post("/webhook-messenger")
+async def webhook_messenger(request: Request):
     """Handles webhook requests from Facebook Messenger."""
-    if request.method == "GET":
-        mode = request.args.get("hub.mode")
-        token = request.args.get("hub.verify_token")
-        challenge = request.args.get("hub.challenge")
-        if mode and token and mode == "subscribe" and token == VERIFY_TOKEN:
-            logger.info("Messenger webhook verified.")
-            return challenge, 200
+    body = await request.body()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received Messenger POST request: %s", body.decode("utf-8", "replace"))
+    try:
+        data = _fb_decoder.decode(body)
+        for entry in data.entry:
+            for messaging_event in entry.messaging:
+                if not (messaging_event.sender and messaging_event.sender.id):
+                    continue
+                fire_and_forget(run_for_user(messaging_event.sender.id, handle_messenger_event(messaging_event)))
+
+        return PlainTextResponse("EVENT_RECEIVED", status_code=200)
+    except Exception as e:
+        logger.error(f"Error processing Messenger request: {e}", exc_info=True)
+        return JSONResponse({"status": "error", "message": "Internal Server Error"}, status_code=500)
+
+@app.get("/webhook-whatsapp")
+async def verify_whatsapp(request: Request):
+    return verify_webhook(request, "WhatsApp")
+
+def normalize_wa_msisdn(msisdn: str) -> str:
+    """Mexican mobile numbers arrive as 521XXXXXXXXXX; the send API and our sessions use 52XXXXXXXXXX."""
+    return "52" + msisdn[3:] if msisdn.startswith("521") and len(msisdn) >= 13 else msisdn
+
+async def handle_whatsapp_message(message_event: WAMessage):
+    """Processes one WhatsApp message event in the background."""
+    sender_id = message_event.from_
+    try:
+        message_text = message_event.text.body if message_event.text else ""
+
+        # MODIFIED: Check for WhatsApp referral data
+        referral_data = message_event.referral
+        if referral_data and "whatsapp" in referral_data:
+            whatsapp_ref = referral_data["whatsapp"]
+            logger.info(f"WhatsApp referral data found for {sender_id}: {whatsapp_ref}")
+
+            source = whatsapp_ref.get("source", {})
+            referral_id = source.get("id")
+
+            if referral_id:
+                # Use headline or body as job title
+                job_title = whatsapp_ref.get("headline") or whatsapp_ref.get("body") or "Puesto de Anuncio de WhatsApp"
+
+                await update_session_with_job_info(
+                    user_id=sender_id,
+                    channel="whatsapp",
+                    job_id=referral_id, # Use the referral ID as the job ID
+                    job_title=job_title,
+                    ad_id_or_ref=referral_id
+                )
+
+        if message_text:
+            await process_message(
+                sender_id=sender_id,
+                user_query=message_text,
+                channel="whatsapp",
+            )
         else:
-            logger.warning("Messenger verification failed.")
-            return "Messenger verification failed.", 403
+            logger.info(f"Received WhatsApp event without text for {sender_id}. No message processed.")
+    except Exception as e:
+        logger.error(f"Error handling WhatsApp message for {sender_id}: {e}", exc_info=True)
 
-    elif request.method == "POST":
-        data = request.json
-        logger.info(f"Received Messenger POST request: {json.dumps(data, indent=2)}")
-        try:
-            for entry in data.get("entry", []):
-                for messaging_event in entry.get("messaging", []):
-                    sender_id = messaging_event.get("sender", {}).get("id")
-                    if not sender_id:
-                        continue
-
-                    message_text = messaging_event.get("message", {}).get("text", "")
-                    referral_data = messaging_event.get("referral")
-                    
-                    job_info_from_referral = None
-                    search_value = None
-
-                    if referral_data:
-                        logger.info(f"Referral data found for {sender_id}: {referral_data}")
-                        if referral_data.get('source') == 'ADS' and 'ad_id' in referral_data:
-                            search_value = referral_data['ad_id']
-                        elif 'ref' in referral_data:
-                            search_value = referral_data['ref']
-                        
-                        if search_value:
-                            job_info_from_referral = await search_by_ad_id(search_value)
-
-                    # ACTUALIZAR SESIÓN SI SE ENCONTRÓ INFO DE VACANTE
-                    if job_info_from_referral and job_info_from_referral.get('Id_Vacante'):
-                        job_id = job_info_from_referral.get('Id_Vacante')  # Cambio: usar Id_Vacante en vez de Id_Puesto
-                        job_title = job_info_from_referral.get('Nombre_de_la_vacante') or job_info_from_referral.get('Puesto')
-                        
-                        await update_session_with_job_info(
-                            user_id=sender_id,
-                            channel="messenger",
-                            job_id=job_id,  # Guardará 42 como current_job_id
-                            job_title=job_title,  # "Operador de camioneta"
-                            ad_id_or_ref=search_value  # "120228908704830333" como current_ad_id
-                        )
-                        
-                        # OPCIONAL: Enviar mensaje de bienvenida si no hay texto
-                        if not message_text:
-                            welcome_message = f"¡Hola! Veo que estás interesado en el puesto de {job_title}. ¿En qué puedo ayudarte?"
-                            await send_message_async("messenger", sender_id, welcome_message)
-
-                    # PROCESAR MENSAJE DE TEXTO SI EXISTE
-                    if message_text:
-                        await process_message(
-                            sender_id=sender_id,
-                            user_query=message_text,
-                            channel="messenger",
-                        )
-                    else:
-                        logger.info(f"Processed referral for {sender_id}, no text message to process.")
-
-            return "EVENT_RECEIVED", 200
-        except Exception as e:
-            logger.error(f"Error processing Messenger request: {e}", exc_info=True)
-            return jsonify({"status": "error", "message": "Internal Server Error"}), 500
-
-@app.route("/webhook-whatsapp", methods=["GET", "POST"])
-async def webhook_whatsapp():
+@app.post("/webhook-whatsapp")
+async def webhook_whatsapp(request: Request):
     """Handles webhook requests from WhatsApp Cloud API."""
-    if request.method == "GET":
-        mode = request.args.get("hub.mode")
-        token = request.args.get("hub.verify_token")
-        challenge = request.args.get("hub.challenge")
-        if mode and token and mode == "subscribe" and token == VERIFY_TOKEN:
-            logger.info("WhatsApp webhook verified.")
-            return challenge, 200
-        else:
-            logger.warning("WhatsApp verification failed.")
-            return "WhatsApp verification failed.", 403
+    body = await request.body()
+    # CHANGED: log as a single line so grep shows the whole payload
+    if VERBOSE_LEVEL >= 3 or logger.isEnabledFor(logging.DEBUG):
+        log_critical_debug(f"Received WhatsApp POST request: {body.decode('utf-8', 'replace')}")
+    try:
+        data = _wa_decoder.decode(body)
+        for entry in data.entry:
+            for change in entry.changes:
+                for message_event in change.value.messages:
+                    message_event.from_ = normalize_wa_msisdn(message_event.from_)
+                    fire_and_forget(run_for_user(message_event.from_, handle_whatsapp_message(message_event)))
+
+        return PlainTextResponse("EVENT_RECEIVED", status_code=200)
+    except Exception as e:
+        logger.error(f"Error processing WhatsApp request: {e}", exc_info=True)
+        return JSONResponse({"status": "error", "message": "Internal Server Error"}, status_code=500)
 
-    elif request.method == "POST":
-        data = request.json
-        # CHANGED: log as a single line so grep shows the whole payload
-        log_critical_debug_json(data, "Received WhatsApp POST request")
-        try:
-            for entry in data.get("entry", []):
-                for change in entry.get("changes", []):
-                    value = change.get("value", {})
-                    if "messages" in value:
-                        for message_event in value["messages"]:
-                            sender_id = message_event["from"]
-                            message_text = message_event.get("text", {}).get("body", "")
-                            
-                            # MODIFIED: Check for WhatsApp referral data
-                            referral_data = message_event.get("referral")
-                            if referral_data and "whatsapp" in referral_data:
-                                whatsapp_ref = referral_data["whatsapp"]
-                                logger.info(f"WhatsApp referral data found for {sender_id}: {whatsapp_ref}")
-                                
-                                source = whatsapp_ref.get("source", {})
-                                referral_id = source.get("id")
-                                
-                                if referral_id:
-                                    # Use headline or body as job title
-                                    job_title = whatsapp_ref.get("headline") or whatsapp_ref.get("body") or "Puesto de Anuncio de WhatsApp"
-                                    
-                                    await update_session_with_job_info(
-                                        user_id=sender_id,
-                                        channel="whatsapp",
-                                        job_id=referral_id, # Use the referral ID as the job ID
-                                        job_title=job_title,
-                                        ad_id_or_ref=referral_id
-                                    )
-
-                            if message_text:
-                                await process_message(
-                                    sender_id=sender_id,
-                                    user_query=message_text,
-                                    channel="whatsapp",
-                                )
-                            else:
-                                logger.info(f"Received WhatsApp event without text for {sender_id}. No message processed.")
-
-            return "EVENT_RECEIVED", 200
-        except Exception as e:
-            logger.error(f"Error processing WhatsApp request: {e}", exc_info=True)
-            return jsonify({"status": "error", "message": "Internal Server Error"}), 500
 
+# Caps how many agent turns (LLM calls) run at once across background tasks
+PROCESS_MESSAGE_CONCURRENCY = int(get_env_var("PROCESS_MESSAGE_CONCURRENCY", "200"))
+_process_semaphore = asyncio.Semaphore(PROCESS_MESSAGE_CONCURRENCY)
 
 # CORRECTED unified message processing logic
 async def process_message(sender_id: str, user_query: str, channel: str):
     """
     Unified function to process incoming messages, using correct session management.
+    The caller holds the user's lock (see run_for_user) for the whole turn.
     """
     logger.info(f"Processing message for {channel} from {sender_id}: '{user_query}'")
     APP_NAME = "Jobs Support"
-    
-    if channel == 'whatsapp':
-        if sender_id.startswith('521'):
-            original_id = sender_id
-            sender_id = sender_id.replace('521', '52', 1)
-            logger.info(f"Correcting WhatsApp number format from {original_id} to {sender_id}")
-    
     USER_ID = sender_id
 
     try:
-        existing_sessions = session_service.list_sessions(
-            app_name=APP_NAME,
-            user_id=USER_ID,
-        )
+        SESSION_ID = lookup_session_id(APP_NAME, USER_ID)
 
-        if existing_sessions and len(existing_sessions.sessions) > 0:
-            SESSION_ID = existing_sessions.sessions[0].id
+        if SESSION_ID:
             logger.info(f"Continuing existing session: {SESSION_ID} for user {USER_ID}")
         else:
             new_session_state = initial_state.copy()
@@ -525,15 +852,17 @@ async def process_message(sender_id: str, user_query: str, channel: str):
                 state=new_session_state,
             )
             SESSION_ID = new_session.id
+            _user_session_cache[USER_ID] = SESSION_ID
             logger.info(f"Created new session: {SESSION_ID} for user {USER_ID}")
 
         add_user_query_to_history(
             session_service, APP_NAME, USER_ID, SESSION_ID, user_query
         )
 
-        agent_response = await call_agent_async(
-            runner, USER_ID, SESSION_ID, user_query, for_whatsapp=(channel == "whatsapp")
-        )
+        async with _process_semaphore:
+            agent_response = await call_agent_async(
+                runner, USER_ID, SESSION_ID, user_query, for_whatsapp=(channel == "whatsapp")
+            )
 
         if agent_response:
             logger.info(f"Sending response to {channel} {sender_id}: '{agent_response}'")
@@ -543,103 +872,184 @@ async def process_message(sender_id: str, user_query: str, channel: str):
 
     except Exception as e:
         logger.error(f"Error in process_message for user {sender_id}: {e}", exc_info=True)
+        # The cached session id may be stale; force a fresh lookup next time
+        _user_session_cache.pop(USER_ID, None)
         error_message = "Lo siento, ocurrió un error al procesar tu mensaje. Por favor, intenta de nuevo más tarde."
+        # Sent under the user's lock so it can't overtake the reply to a later message
         await send_message_async(channel, sender_id, error_message)
 
-def get_sessions_from_db():
-    """Connects to the database and returns a list of users with their sessions."""
+# Indexes backing the dashboard query (ADK creates the tables but not these)
+DASHBOARD_INDEXES = """
+    CREATE INDEX IF NOT EXISTS ix_events_session_ts ON events(session_id, timestamp);
+    CREATE INDEX IF NOT EXISTS ix_sessions_app_user ON sessions(app_name, user_id, update_time DESC);
+"""
+DASHBOARD_FETCH_SIZE = 1000
+
+def ensure_dashboard_indexes():
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            conn.executescript(DASHBOARD_INDEXES)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not create dashboard indexes: {e}")
+
+ensure_dashboard_indexes()
+
+MEXICO_TZ = ZoneInfo('America/Mexico_City')
+
+@functools.lru_cache(maxsize=8192)
+def convert_to_mexico_time(timestamp_str):
+    if not timestamp_str: return "Never"
     try:
-        conn = sqlite3.connect('./chambella_agent_data.db')
+        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        return dt.astimezone(MEXICO_TZ).strftime('%Y-%m-%d %H:%M:%S CST')
+    except (ValueError, TypeError):
+        return timestamp_str
+
+# Parsed dashboard state keyed by (session_id, update_time): any write to a session
+# bumps its update_time, so the raw JSON never needs to be hashed or kept around.
+_state_cache = LRUCache(maxsize=4096)
+_state_cache_lock = threading.Lock()
+
+def _parse_state(session_id: str, update_time: str, state_json: str):
+    """Parsed session state, memoized until the session's update_time changes.
+
+    Returned read-only because the same mapping is shared across dashboard renders.
+    """
+    key = (session_id, update_time)
+    with _state_cache_lock:
+        state = _state_cache.get(key)
+    if state is None:
+        state = types.MappingProxyType(orjson.loads(state_json))
+        with _state_cache_lock:
+            _state_cache[key] = state
+    return state
+
+# Dashboard reads reuse one connection per thread: the page cache stays warm and
+# sqlite3's statement cache keeps the compiled dashboard query between requests.
+_conn_local = threading.local()
+_all_sqlite_conns = set()
+
+def _get_conn():
+    conn = getattr(_conn_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=100)
+        apply_sqlite_pragmas(conn)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        _conn_local.conn = conn
+        _all_sqlite_conns.add(conn)
+    return conn
+
+def _drop_conn():
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None:
+        _conn_local.conn = None
+        _all_sqlite_conns.discard(conn)
+        conn.close()
 
-        mexico_tz = pytz.timezone('America/Mexico_City')
-        
-        def convert_to_mexico_time(timestamp_str):
-            if not timestamp_str: return "Never"
-            try:
-                dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                return dt.astimezone(mexico_tz).strftime('%Y-%m-%d %H:%M:%S CST')
-            except (ValueError, TypeError):
-                return timestamp_str
+def close_sqlite_connections():
+    """Checkpoint the WAL into the main DB file and close every dashboard connection."""
+    conns = list(_all_sqlite_conns)
+    _all_sqlite_conns.clear()
+    for i, conn in enumerate(conns):
+        try:
+            if i == 0:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Error closing SQLite connection: {e}")
 
-        cursor.execute("""
-            SELECT s.user_id, s.state, s.id as session_id, s.create_time, s.update_time
-            FROM sessions s WHERE s.app_name = 'Jobs Support' ORDER BY s.user_id, s.update_time DESC
-        """)
-        
-        users_map = {}
-        for row in cursor.fetchall():
-            user_id = row['user_id']
-            state = json.loads(row['state'])
-
-            if user_id not in users_map:
-                users_map[user_id] = {
-                    'user_id': user_id,
-                    'user_name': state.get('user_name', ''),
-                    'contact_phone_number': state.get('contact_phone_number', ''),
-                    'last_access': convert_to_mexico_time(row['update_time']),
-                    'sessions': []
-                }
-            session_data = {
-                'session_id': row['session_id'],
-                'current_ad_id': state.get('current_ad_id'),
-                'current_job_id': state.get('current_job_id'),
-                'current_job_title': state.get('current_job_title'),
-                'create_time': convert_to_mexico_time(row['create_time']),
-                'update_time': convert_to_mexico_time(row['update_time']),
-                'interaction_history': state.get('interaction_history', []),
-                'applied_jobs': state.get('applied_jobs', []),
-                'events': []
-            }
-            users_map[user_id]['sessions'].append(session_data)
-
-        session_id_map = {}
-        for user in users_map.values():
-            for session in user['sessions']:
-                session_id_map[session['session_id']] = session
+def get_sessions_from_db():
+    """Connects to the database and returns a list of users with their sessions."""
+    try:
+        cursor = _get_conn().cursor()
 
+        # One pass over sessions LEFT JOIN events: rows arrive grouped by session
+        # (newest session first per user) with that session's events in time order.
         cursor.execute("""
-            SELECT session_id, author, timestamp, content
-            FROM events
-            WHERE app_name = 'Jobs Support'
-            ORDER BY timestamp ASC
+            SELECT s.user_id, s.state, s.id AS session_id, s.create_time, s.update_time,
+                   e.id AS event_id, e.author, e.timestamp, e.content
+            FROM sessions s
+            LEFT JOIN events e
+                   ON e.session_id = s.id AND e.app_name = s.app_name AND e.user_id = s.user_id
+            WHERE s.app_name = 'Jobs Support'
+            ORDER BY s.user_id, s.update_time DESC, s.id, e.timestamp
         """)
-        for row in cursor.fetchall():
-            session_id, author, timestamp, content_json = row
-            content = json.loads(content_json) if content_json else {}
-            event = {
-                'author': author,
-                'timestamp': convert_to_mexico_time(timestamp),
-                'content': content
-            }
-            if session_id in session_id_map:
-                session_id_map[session_id]['events'].append(event)
-
-        users = list(users_map.values())
-        conn.close()
-        return users
+
+        users_map = {}
+        current_session_id = None
+        events = None
+        while (rows := cursor.fetchmany(DASHBOARD_FETCH_SIZE)):
+            for row in rows:
+                session_id = row['session_id']
+                if session_id != current_session_id:
+                    current_session_id = session_id
+                    user_id = row['user_id']
+                    update_time = convert_to_mexico_time(row['update_time'])
+                    state = _parse_state(session_id, row['update_time'], row['state'])
+
+                    # Single lookup per session; the first (newest) session seeds the user entry
+                    user = users_map.get(user_id)
+                    if user is None:
+                        user = users_map[user_id] = {
+                            'user_id': user_id,
+                            'user_name': state.get('user_name', ''),
+                            'contact_phone_number': state.get('contact_phone_number', ''),
+                            'last_access': update_time,
+                            'sessions': []
+                        }
+                    events = []
+                    user['sessions'].append({
+                        'session_id': session_id,
+                        'current_ad_id': state.get('current_ad_id'),
+                        'current_job_id': state.get('current_job_id'),
+                        'current_job_title': state.get('current_job_title'),
+                        'create_time': convert_to_mexico_time(row['create_time']),
+                        'update_time': update_time,
+                        'interaction_history': state.get('interaction_history', []),
+                        'applied_jobs': state.get('applied_jobs', []),
+                        'events': events
+                    })
+
+                if row['event_id'] is not None:
+                    content_json = row['content']
+                    events.append({
+                        'author': row['author'],
+                        'timestamp': convert_to_mexico_time(row['timestamp']),
+                        'content': json.loads(content_json) if content_json else {}
+                    })
+
+        cursor.close()
+        return list(users_map.values())
+    except sqlite3.Error as e:
+        logger.error(f"Error in get_sessions_from_db: {e}")
+        _drop_conn()
+        return []
     except Exception as e:
         logger.error(f"Error in get_sessions_from_db: {e}")
         return []
         
 # ===== Database Query Interface =====
-@app.route('/', methods=['GET'])
-def db_interface():
+@app.get('/')
+def db_interface(request: Request):
     """Serve the database query interface."""
     try:
         users = get_sessions_from_db()
-        return render_template('index.html', users=users, delete_password=DELETE_PASSWORD)
+        return templates.TemplateResponse(
+            request, 'index.html', {"users": users, "delete_password": DELETE_PASSWORD}
+        )
     except Exception as e:
         logger.error(f"Error serving database interface: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
 
 # ===== FIX: Added Delete Session API Endpoint =====
-@app.route('/api/delete-session', methods=['POST'])
-def delete_session():
+@app.post('/api/delete-session')
+async def delete_session(request: Request):
     """API endpoint to delete a session and create a new empty one"""
     try:
-        data = request.get_json()
+        data = await request.json()
         user_id = data.get('user_id')
         session_id = data.get('session_id')
         password = data.get('password')
@@ -648,104 +1058,218 @@ def delete_session():
         
         if password != DELETE_PASSWORD:
             logger.warning(f"Invalid password attempt for user {user_id}")
-            return jsonify({'success': False, 'error': 'Incorrect password'}), 403
+            return JSONResponse({'success': False, 'error': 'Incorrect password'}, status_code=403)
         
         if not user_id or not session_id:
             logger.error(f"Missing required fields: user_id={user_id}, session_id={session_id}")
-            return jsonify({'success': False, 'error': 'Missing user_id or session_id'}), 400
+            return JSONResponse({'success': False, 'error': 'Missing user_id or session_id'}, status_code=400)
         
         APP_NAME = "Jobs Support"
-        
-        try:
-            current_session = session_service.get_session(
-                app_name=APP_NAME,
-                user_id=user_id,
-                session_id=session_id
-            )
+
+        # Don't swap the session out from under a turn that is in progress
+        async with user_lock(user_id):
+            try:
+                current_session = session_service.get_session(
+                    app_name=APP_NAME,
+                    user_id=user_id,
+                    session_id=session_id
+                )
             
-            preserved_data = {
-                "user_name": current_session.state.get("user_name", ""),
-                "last_name": current_session.state.get("last_name", ""),
-                "email": current_session.state.get("email", ""),
-                "contact_phone_number": current_session.state.get("contact_phone_number", ""),
-                "channel": current_session.state.get("channel", ""),
-                "phone_number": current_session.state.get("phone_number", ""),
-            }
+                preserved_data = {
+                    "user_name": current_session.state.get("user_name", ""),
+                    "last_name": current_session.state.get("last_name", ""),
+                    "email": current_session.state.get("email", ""),
+                    "contact_phone_number": current_session.state.get("contact_phone_number", ""),
+                    "channel": current_session.state.get("channel", ""),
+                    "phone_number": current_session.state.get("phone_number", ""),
+                }
             
-            logger.info(f"Preserved user data: {preserved_data}")
+                logger.info(f"Preserved user data: {preserved_data}")
             
-        except Exception as e:
-            logger.warning(f"Could not get current session data: {e}")
-            preserved_data = {}
+            except Exception as e:
+                logger.warning(f"Could not get current session data: {e}")
+                preserved_data = {}
         
-        try:
-            session_service.delete_session(
-                app_name=APP_NAME,
-                user_id=user_id,
-                session_id=session_id
-            )
-            logger.info(f"Successfully deleted session {session_id} for user {user_id}")
-        except Exception as e:
-            logger.error(f"Error deleting session {session_id}: {e}")
-            return jsonify({'success': False, 'error': f'Failed to delete session: {str(e)}'}), 500
+            try:
+                session_service.delete_session(
+                    app_name=APP_NAME,
+                    user_id=user_id,
+                    session_id=session_id
+                )
+                _user_session_cache.pop(user_id, None)
+                delete_interaction_log(user_id)
+                logger.info(f"Successfully deleted session {session_id} for user {user_id}")
+            except Exception as e:
+                logger.error(f"Error deleting session {session_id}: {e}")
+                return JSONResponse({'success': False, 'error': f'Failed to delete session: {str(e)}'}, status_code=500)
         
-        try:
-            new_clean_state = initial_state.copy()
-            new_clean_state.update(preserved_data)
+            try:
+                new_clean_state = initial_state.copy()
+                new_clean_state.update(preserved_data)
             
-            new_session = session_service.create_session(
-                app_name=APP_NAME,
-                user_id=user_id,
-                state=new_clean_state
-            )
+                new_session = session_service.create_session(
+                    app_name=APP_NAME,
+                    user_id=user_id,
+                    state=new_clean_state
+                )
             
-            logger.info(f"Successfully created new empty session {new_session.id} for user {user_id}")
+                _user_session_cache[user_id] = new_session.id
+                logger.info(f"Successfully created new empty session {new_session.id} for user {user_id}")
             
-            return jsonify({
-                'success': True, 
-                'message': 'Session deleted and new empty session created successfully',
-                'new_session_id': new_session.id
-            }), 200
+                return JSONResponse({
+                    'success': True, 
+                    'message': 'Session deleted and new empty session created successfully',
+                    'new_session_id': new_session.id
+                }, status_code=200)
             
-        except Exception as e:
-            logger.error(f"Error creating new session for user {user_id}: {e}")
-            return jsonify({'success': False, 'error': f'Failed to create new session: {str(e)}'}), 500
+            except Exception as e:
+                logger.error(f"Error creating new session for user {user_id}: {e}")
+                return JSONResponse({'success': False, 'error': f'Failed to create new session: {str(e)}'}, status_code=500)
             
     except Exception as e:
         logger.error(f"Error in delete_session API: {e}", exc_info=True)
-        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+        return JSONResponse({'success': False, 'error': 'Internal server error'}, status_code=500)
 
 # ===== Server Startup and Shutdown =====
 PORT = int(os.environ.get("PORT", 7010))
 HOST = os.environ.get("HOST", "0.0.0.0")
+# One worker by default: the per-user locks, session-id cache, buffered history,
+# alert de-duplication and job-info caches all live in process memory. Raising it
+# needs that state shared (e.g. DB-backed session lookup) and the load balancer
+# routing each sender id to the same worker, or per-user ordering breaks.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+# uvloop/httptools when installed (uvloop has no Windows build), stdlib otherwise
+UVICORN_LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+UVICORN_HTTP = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+_history_flush_task = None
 
 async def startup_handler():
     logger.info("Starting up runner and session service...")
+    # Tasks whose coroutine finishes without suspending (cached lookups, warm
+    # sockets) complete inside create_task instead of waiting a loop tick. 3.12+ only.
+    eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_task_factory is not None:
+        asyncio.get_running_loop().set_task_factory(eager_task_factory)
+        logger.info("Using asyncio.eager_task_factory.")
+    global _alert_drain_task, _history_flush_task
+    _alert_drain_task = asyncio.create_task(drain_telegram_alerts())
+    _history_flush_task = asyncio.create_task(flush_history_loop())
+
+# Seconds to wait for in-flight message tasks and queued alerts before closing resources
+SHUTDOWN_GRACE_PERIOD = float(os.environ.get("SHUTDOWN_GRACE_PERIOD", 20))
+_shutdown_started = False
 
 async def shutdown_handler():
+    global _shutdown_started
+    if _shutdown_started:
+        return
+    _shutdown_started = True
     logger.info("Shutting down...")
+
+    # Let in-flight agent turns finish sending their replies
+    if _background_tasks:
+        logger.info(f"Waiting for {len(_background_tasks)} background task(s)...")
+        _, pending = await asyncio.wait(set(_background_tasks), timeout=SHUTDOWN_GRACE_PERIOD)
+        for task in pending:
+            task.cancel()
+
+    # Write interaction history still buffered in this worker
+    if _history_flush_task is not None:
+        _history_flush_task.cancel()
+    flush_pending_history(include_active=True)
+
+    if _alert_drain_task is not None:
+        try:
+            await asyncio.wait_for(_alert_queue.join(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {_alert_queue.qsize()} unsent Telegram alert(s).")
+        _alert_drain_task.cancel()
+
+    await close_http_session()
+    await close_job_info_session()
+    await close_job_discovery_session()
+    close_sqlite_connections()
+    if _db_engine is not None:
+        _db_engine.dispose()
     logger.info("Shutdown complete.")
 
-def signal_handler(sig, frame):
-    logger.info(f"Received signal {sig}, initiating shutdown...")
-    asyncio.create_task(shutdown_handler())
+app.add_event_handler("startup", startup_handler)
+app.add_event_handler("shutdown", shutdown_handler)
+
+class ManagedServer(uvicorn.Server):
+    """uvicorn server that leaves SIGINT/SIGTERM to serve_forever's loop handlers."""
+
+    def install_signal_handlers(self):  # uvicorn < 0.29
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):  # uvicorn >= 0.29
+        yield
+
+
+async def serve_forever():
+    """Single-process server: signals are handled on the running loop."""
+    config = uvicorn.Config(
+        app,
+        host=HOST,
+        port=PORT,
+        log_level="info",
+        http=UVICORN_HTTP,
+        access_log=False,
+    )
+    server = ManagedServer(config)
+
+    loop = asyncio.get_running_loop()
+    shutdown_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, shutdown_event.set)
+        except NotImplementedError:  # Windows event loops
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(shutdown_event.set))
+
+    serve_task = asyncio.create_task(server.serve())
+    signal_task = asyncio.create_task(shutdown_event.wait())
+    done, _ = await asyncio.wait({serve_task, signal_task}, return_when=asyncio.FIRST_COMPLETED)
+    if signal_task in done:
+        logger.info("Received shutdown signal, stopping server...")
+        # Stops accepting connections, drains in-flight requests, then runs shutdown_handler
+        server.should_exit = True
+        await serve_task
+    else:
+        signal_task.cancel()
+    flush_pending_history(include_active=True)
+
 
 def start_server():
-    """Start the async Flask server with uvicorn"""
+    """Start the FastAPI server with uvicorn"""
     print(f"🚀 Starting Chambella unified server with verbosity level {VERBOSE_LEVEL}")
     print("   Level 0: Minimal output")
     print("   Level 1: Basic agent flow")
     print("   Level 2: Detailed with session state")
     print("   Level 3: Full debug with HTTP details")
-
+    print(f"   Workers: {WEB_CONCURRENCY} (loop={UVICORN_LOOP}, http={UVICORN_HTTP})")
+
+    if WEB_CONCURRENCY <= 1:
+        if UVICORN_LOOP == "uvloop":
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        asyncio.run(serve_forever())
+        return
+
+    # Workers need an import string so each process builds its own app, session
+    # service and aiohttp session; SQLite is shared between them on disk.
+    # uvicorn's supervisor and each worker handle SIGINT/SIGTERM themselves.
     uvicorn.run(
-        asgi_app,
+        "main:app",
         host=HOST,
         port=PORT,
         log_level="info",
+        workers=WEB_CONCURRENCY,
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        access_log=False,
     )
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    start_server()
\ No newline at end of file
+    start_server()
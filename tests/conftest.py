@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# config.py refuses to import without an MCP port
+os.environ.setdefault("MCP_PORT", "8000")
@@ -0,0 +1,149 @@
+"""Interaction-history buffering in utils: flush points, in-flight turn counting, spill."""
+import asyncio
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+import utils
+from google.adk.sessions import DatabaseSessionService
+
+APP = "Jobs Support"
+USER = "5215550000000"
+SESSION = "session-1"
+KEY = (APP, USER, SESSION)
+
+
+class FakeSessionService:
+    """Keeps one session in memory and records every state delta appended to it."""
+
+    def __init__(self, history=None):
+        self.state = {"interaction_history": list(history or [])}
+        self.deltas = []
+
+    def get_session(self, app_name, user_id, session_id):
+        return SimpleNamespace(id=session_id, state=copy.deepcopy(self.state))
+
+    def append_event(self, session, event):
+        delta = event.actions.state_delta
+        self.deltas.append(delta)
+        self.state.update(copy.deepcopy(delta))
+        return event
+
+
+class GatedRunner:
+    """Runner whose turns each wait on their own gate before answering."""
+
+    app_name = APP
+
+    def __init__(self, session_service):
+        self.session_service = session_service
+        self.gates = []
+
+    async def run_async(self, user_id, session_id, new_message):
+        gate = asyncio.Event()
+        self.gates.append(gate)
+        await gate.wait()
+        text = new_message.parts[0].text
+        yield SimpleNamespace(
+            author="job_assistant_agent",
+            is_final_response=lambda: True,
+            content=SimpleNamespace(parts=[SimpleNamespace(text=f"re: {text}")]),
+        )
+
+
+@pytest.fixture(autouse=True)
+def clean_buffer(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "INTERACTION_LOG_DIR", str(tmp_path))
+    utils._pending_history.clear()
+    utils._active_sessions.clear()
+    yield
+    utils._pending_history.clear()
+    utils._active_sessions.clear()
+
+
+def test_entries_are_buffered_until_flushed():
+    service = FakeSessionService()
+    utils.add_user_query_to_history(service, APP, USER, SESSION, "hola")
+    utils.add_user_query_to_history(service, APP, USER, SESSION, "¿hay vacantes?")
+    assert service.deltas == []
+
+    utils.flush_session_history(*KEY)
+
+    assert len(service.deltas) == 1
+    queries = [entry["query"] for entry in service.state["interaction_history"]]
+    assert queries == ["hola", "¿hay vacantes?"]
+    assert KEY not in utils._pending_history
+
+
+def test_threshold_flush_skips_sessions_with_a_turn_in_progress():
+    service = FakeSessionService()
+    utils._active_sessions[KEY] += 1
+    for i in range(utils.HISTORY_FLUSH_MAX_ENTRIES):
+        utils.add_user_query_to_history(service, APP, USER, SESSION, f"q{i}")
+    assert service.deltas == []
+
+    utils._active_sessions.clear()
+    utils.add_user_query_to_history(service, APP, USER, SESSION, "one more")
+    assert len(service.deltas) == 1
+
+
+def test_overlapping_turns_flush_only_after_the_last_one_finishes():
+    service = FakeSessionService()
+    runner = GatedRunner(service)
+
+    async def scenario():
+        first = asyncio.create_task(utils.call_agent_async(runner, USER, SESSION, "uno", verbose_level=0))
+        second = asyncio.create_task(utils.call_agent_async(runner, USER, SESSION, "dos", verbose_level=0))
+        while len(runner.gates) < 2:
+            await asyncio.sleep(0)
+
+        runner.gates[0].set()
+        assert await first == "re: uno"
+        assert service.deltas == []
+        assert utils._active_sessions[KEY] == 1
+
+        runner.gates[1].set()
+        assert await second == "re: dos"
+
+    asyncio.run(scenario())
+
+    assert len(service.deltas) == 1
+    responses = [entry["response"] for entry in service.state["interaction_history"]]
+    assert responses == ["re: uno", "re: dos"]
+    assert KEY not in utils._active_sessions
+
+
+def test_history_over_the_cap_is_spilled_and_read_back_in_order(monkeypatch):
+    monkeypatch.setattr(utils, "HISTORY_MAX_ENTRIES", 3)
+    service = FakeSessionService(history=[{"action": "user_query", "query": "q0"}])
+    entries = [{"action": "user_query", "query": f"q{i}"} for i in range(1, 5)]
+
+    utils.write_interaction_history(service, APP, USER, SESSION, entries)
+
+    in_state = service.state["interaction_history"]
+    assert [entry["query"] for entry in in_state] == ["q2", "q3", "q4"]
+    full = utils.read_full_history(USER, in_state)
+    assert [entry["query"] for entry in full] == [f"q{i}" for i in range(5)]
+
+    utils.delete_interaction_log(USER)
+    assert utils.read_full_history(USER, in_state) == in_state
+
+
+def test_flushes_persist_through_the_real_database_session_service(tmp_path):
+    service = DatabaseSessionService(db_url=f"sqlite:///{tmp_path / 'sessions.db'}")
+    session = service.create_session(app_name=APP, user_id=USER, state={"interaction_history": []})
+    key = (APP, USER, session.id)
+
+    utils.add_user_query_to_history(service, APP, USER, session.id, "hola")
+    utils.add_agent_response_to_history(service, APP, USER, session.id, "job_assistant_agent", "¡Hola!")
+    utils.flush_session_history(*key)
+    # A later flush reloads the session, so append_event must not reject it as stale
+    utils.add_user_query_to_history(service, APP, USER, session.id, "¿hay vacantes?")
+    utils.flush_session_history(*key)
+
+    stored = service.get_session(app_name=APP, user_id=USER, session_id=session.id)
+    actions = [entry["action"] for entry in stored.state["interaction_history"]]
+    assert actions == ["user_query", "agent_response", "user_query"]
@@ -0,0 +1,84 @@
+"""vacantes_admin list pagination: cursor encoding and the search_after round trip."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("opensearchpy")
+pytest.importorskip("hypercorn")
+
+from vacantes_admin import app as vacantes_app
+
+
+class FakeOpenSearch:
+    """Answers search with the given hits (each with its sort tuple) and records the request bodies."""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.bodies = []
+
+    async def search(self, index, body, filter_path=None):
+        self.bodies.append(body)
+        hits = self.hits[: body["size"]]
+        resp = {"hits": {"total": {"value": len(self.hits)}}}
+        if hits:
+            resp["hits"]["hits"] = hits
+        return resp
+
+
+def _hit(doc_id, ts):
+    return {"_id": doc_id, "_source": {"nombre_de_la_vacante": doc_id}, "sort": [ts, doc_id]}
+
+
+@pytest.fixture
+def es(monkeypatch):
+    fake = FakeOpenSearch([_hit("a", 300), _hit("b", 200), _hit("c", 100)])
+    monkeypatch.setattr(vacantes_app, "get_es_client", lambda: fake)
+    vacantes_app._list_cache.clear()
+    return fake
+
+
+def _get(path):
+    async def go():
+        resp = await vacantes_app.app.test_client().get(path)
+        return resp.status_code, await resp.get_json()
+    return asyncio.run(go())
+
+
+def test_cursor_round_trip():
+    values = [1719878400000, "abc-123"]
+    assert vacantes_app._decode_cursor(vacantes_app._encode_cursor(values)) == values
+
+
+def test_cursor_with_wrong_arity_is_rejected():
+    with pytest.raises(ValueError):
+        vacantes_app._decode_cursor(vacantes_app._encode_cursor([1]))
+
+
+def test_full_page_returns_a_cursor_that_continues_after_its_last_hit(es):
+    status, data = _get("/api/vacantes?limit=2")
+    assert status == 200
+    assert [item["_id"] for item in data["items"]] == ["a", "b"]
+    assert vacantes_app._decode_cursor(data["next_after"]) == [200, "b"]
+
+    status, _ = _get(f"/api/vacantes?limit=2&after={data['next_after']}")
+    assert status == 200
+    assert es.bodies[-1]["search_after"] == [200, "b"]
+
+
+def test_short_page_has_no_next_cursor(es):
+    status, data = _get("/api/vacantes?limit=5")
+    assert status == 200
+    assert data["next_after"] is None
+
+
+def test_limit_zero_returns_an_empty_page(es):
+    status, data = _get("/api/vacantes?limit=0")
+    assert status == 200
+    assert data["items"] == [] and data["next_after"] is None
+
+
+def test_malformed_cursor_is_a_400(es):
+    status, data = _get("/api/vacantes?after=not-a-cursor")
+    assert status == 400
+    assert "after" in data["error"]
@@ -2,14 +2,21 @@
 
 from datetime import datetime
 import asyncio
+from config import LITELLM_SESSION_ID, LITELLM_USER_ID
+from google.adk.events import Event, EventActions
 from google.genai import types
 from google.genai.errors import ServerError
 import logging
 import argparse
+from collections import Counter
+import json
+import os
+import re
 import sys
 
 # LOGGING CONFIGURATION - Now supports levels 0-3
 VERBOSE_LEVEL = 0  # Default level, will be overridden by command line args
+_configured_level = None  # Level last applied by configure_llm_logging
 
 def parse_verbosity_args():
     """Parse command line arguments for verbosity level"""
@@ -26,8 +33,13 @@ def parse_verbosity_args():
     return VERBOSE_LEVEL
 
 def configure_llm_logging(verbose_level=None):
+    """Set library logger levels for the verbosity level; called by the entry point after parsing args."""
+    global _configured_level
     if verbose_level is None:
         verbose_level = VERBOSE_LEVEL
+    if verbose_level == _configured_level:
+        return
+    _configured_level = verbose_level
     
     if verbose_level == 0:
         logging.getLogger('google.adk.models.google_llm').setLevel(logging.ERROR)
@@ -54,8 +66,6 @@ def configure_llm_logging(verbose_level=None):
         logging.getLogger('httpx').setLevel(logging.INFO)
         logging.getLogger('google.adk.sessions.database_session_service').setLevel(logging.DEBUG)
 
-configure_llm_logging()
-
 class Colors:
     RESET, BOLD, UNDERLINE = "\033[0m", "\033[1m", "\033[4m"
     BLACK, RED, GREEN, YELLOW = "\033[30m", "\033[31m", "\033[32m", "\033[33m"
@@ -63,9 +73,134 @@ class Colors:
     BG_BLACK, BG_RED, BG_GREEN, BG_YELLOW = "\033[40m", "\033[41m", "\033[42m", "\033[43m"
     BG_BLUE, BG_MAGENTA, BG_CYAN, BG_WHITE = "\033[44m", "\033[45m", "\033[46m", "\033[47m"
 
-def update_interaction_history(session_service, app_name, user_id, session_id, entry):
+# Interaction-history entries are buffered per session and written together in a
+# single state-delta event: at the end of each agent turn, once a session has
+# HISTORY_FLUSH_MAX_ENTRIES waiting, or by flush_history_loop for leftovers.
+# Sessions with a turn in progress are left alone, because ADK rejects an
+# append_event from the runner if the stored session changed underneath it;
+# _active_sessions counts the turns in flight per session and the buffer is
+# only written once the last of them has finished.
+HISTORY_FLUSH_INTERVAL = 2.0
+HISTORY_FLUSH_MAX_ENTRIES = 20
+
+# Only the most recent entries stay in session state (it is rewritten on every
+# append); older ones are moved to an append-only JSONL file per user.
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "20"))
+INTERACTION_LOG_DIR = os.getenv(
+    "INTERACTION_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "interactions")
+)
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+_pending_history = {}  # (app_name, user_id, session_id) -> (session_service, [entries])
+_active_sessions = Counter()  # (app_name, user_id, session_id) -> turns in progress
+
+
+def write_interaction_history(session_service, app_name, user_id, session_id, entries, session=None):
+    """Escribir una o más entradas al historial de interacciones con un solo append_event.
+
+    ``session`` evita volver a leerla, pero debe estar al día (append_event rechaza
+    una sesión obsoleta). Devuelve la sesión actualizada (o None si ya no existe).
+    """
+    if session is None:
+        session = session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+    if session is None:
+        logging.warning(f"Session {session_id} no longer exists; dropping {len(entries)} history entries.")
+        return None
+
+    # Extend the freshly loaded history list in place (no copy of the list or the state)
+    interaction_history = session.state.get("interaction_history")
+    if interaction_history is None:
+        interaction_history = []
+    interaction_history.extend(entries)
+
+    overflow = len(interaction_history) - HISTORY_MAX_ENTRIES
+    if overflow > 0:
+        try:
+            spill_interaction_history(user_id, interaction_history[:overflow])
+        except OSError as e:
+            logging.error(f"Could not spill interaction history for {user_id}: {e}")
+        del interaction_history[:overflow]
+
+    # Persist only the changed key as a state delta on the existing session
+    # (author "user" so the runner does not treat it as an agent turn)
+    event = Event(
+        invocation_id=Event.new_id(),
+        author="user",
+        actions=EventActions(
+            state_delta={"interaction_history": interaction_history}
+        ),
+    )
+    session_service.append_event(session=session, event=event)
+    return session
+
+
+def _interaction_log_path(user_id):
+    return os.path.join(INTERACTION_LOG_DIR, f"{_UNSAFE_FILENAME_CHARS.sub('_', str(user_id))}.jsonl")
+
+
+def spill_interaction_history(user_id, entries):
+    """Append entries trimmed from session state to the user's interaction log."""
+    os.makedirs(INTERACTION_LOG_DIR, exist_ok=True)
+    with open(_interaction_log_path(user_id), "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+
+
+def read_full_history(user_id, interaction_history=()):
+    """Spilled entries from the user's interaction log followed by the in-state tail."""
+    spilled = []
+    try:
+        with open(_interaction_log_path(user_id), encoding="utf-8") as f:
+            spilled = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        pass
+    return spilled + list(interaction_history)
+
+
+def delete_interaction_log(user_id):
+    """Remove the user's spilled interaction history (on session delete or job reset)."""
+    try:
+        os.remove(_interaction_log_path(user_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.error(f"Could not delete interaction log for {user_id}: {e}")
+
+
+def flush_session_history(app_name, user_id, session_id, session=None):
+    """Write any buffered history entries for one session; returns the updated session if written."""
+    pending = _pending_history.pop((app_name, user_id, session_id), None)
+    if not pending:
+        return None
+    session_service, entries = pending
+    try:
+        return write_interaction_history(session_service, app_name, user_id, session_id, entries, session=session)
+    except Exception as e:
+        print(f"Error al actualizar el historial de interacciones: {e}")
+        return None
+
+
+def flush_pending_history(include_active=False):
+    """Write buffered history for every session (skipping in-flight turns unless include_active)."""
+    for key in list(_pending_history):
+        if include_active or key not in _active_sessions:
+            flush_session_history(*key)
+
+
+async def flush_history_loop(interval=HISTORY_FLUSH_INTERVAL):
+    """Background task: periodically flush buffered history entries."""
+    while True:
+        await asyncio.sleep(interval)
+        flush_pending_history()
+
+
+def update_interaction_history(session_service, app_name, user_id, session_id, entry, session=None):
     """Agregar una entrada al historial de interacciones en el estado.
 
+    La entrada se guarda en memoria y se escribe junto con las demás pendientes
+    de la sesión (ver flush_session_history).
+
     Args:
         session_service: La instancia del servicio de sesión
         app_name: El nombre de la aplicación
@@ -74,46 +209,24 @@ def update_interaction_history(session_service, app_name, user_id, session_id, e
         entry: Un diccionario que contiene los datos de la interacción
             - requiere la clave 'action' (por ejemplo, 'user_query', 'agent_response')
             - otras claves son flexibles dependiendo del tipo de acción
+        session: Sesión ya cargada (opcional) para no volver a leerla al escribir
     """
     try:
-        # Get current session
-        session = session_service.get_session(
-            app_name=app_name, user_id=user_id, session_id=session_id
-        )
-
-        # Get current interaction history
-        interaction_history = session.state.get("interaction_history", [])
-
         # Add timestamp if not already present
         if "timestamp" not in entry:
             entry["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        # Add the entry to interaction history
-        interaction_history.append(entry)
-
-        # Create updated state
-        updated_state = session.state.copy()
-        updated_state["interaction_history"] = interaction_history
+        key = (app_name, user_id, session_id)
+        _, entries = _pending_history.setdefault(key, (session_service, []))
+        entries.append(entry)
 
-        # Delete the old session
-        session_service.delete_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=session_id
-        )
-
-        # Create a new session with the updated state and the same ID
-        session_service.create_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=session_id,  # Use the same session_id
-            state=updated_state,
-        )
+        if len(entries) >= HISTORY_FLUSH_MAX_ENTRIES and key not in _active_sessions:
+            flush_session_history(*key, session=session)
     except Exception as e:
         print(f"Error al actualizar el historial de interacciones: {e}")
 
 
-def add_user_query_to_history(session_service, app_name, user_id, session_id, query):
+def add_user_query_to_history(session_service, app_name, user_id, session_id, query, session=None):
     """Agregar una consulta del usuario al historial de interacciones."""
     try:
         update_interaction_history(
@@ -125,12 +238,13 @@ def add_user_query_to_history(session_service, app_name, user_id, session_id, qu
                 "action": "user_query",
                 "query": query,
             },
+            session=session,
         )
     except Exception as e:
         print(f"Error al actualizar el historial de interacciones: {e}")
 
 
-def add_agent_response_to_history(session_service, app_name, user_id, session_id, agent_name, response):
+def add_agent_response_to_history(session_service, app_name, user_id, session_id, agent_name, response, session=None):
     """Adds an agent's response to the interaction history."""
     update_interaction_history(
         session_service,
@@ -142,23 +256,32 @@ def add_agent_response_to_history(session_service, app_name, user_id, session_id
             "agent": agent_name,
             "response": response,
         },
+        session=session,
     )
 
 
+_ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', re.ASCII)
+
+
 def prepare_whatsapp_response(text):
     if not text:
         return "Lo siento, no pude procesar su consulta. Por favor intente nuevamente."
-    import re
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+    return _ANSI_ESCAPE.sub('', text)
+
 
+def display_state(session_service, app_name, user_id, session_id, label="Estado Actual", session=None, verbose_level=None):
+    """Displays the current session state in a formatted way.
 
-def display_state(session_service, app_name, user_id, session_id, label="Estado Actual"):
-    """Displays the current session state in a formatted way."""
+    Does nothing below verbosity level 1; pass ``session`` to skip re-reading it.
+    """
+    if verbose_level is None: verbose_level = VERBOSE_LEVEL
+    if verbose_level < 1:
+        return
     try:
-        session = session_service.get_session(
-            app_name=app_name, user_id=user_id, session_id=session_id
-        )
+        if session is None:
+            session = session_service.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
         print(f"\n{'-' * 10} {label} {'-' * 10}")
         user_name = session.state.get("user_name", "No registrado") or "No registrado"
         print(f"👤 Usuario: {user_name}")
@@ -174,7 +297,7 @@ def display_state(session_service, app_name, user_id, session_id, label="Estado
         else:
             print("💼 Postulaciones Realizadas: Ninguna")
 
-        interaction_history = session.state.get("interaction_history", [])
+        interaction_history = read_full_history(user_id, session.state.get("interaction_history", []))
         if interaction_history:
             print("📝 Historial de Interacciones:")
             for idx, interaction in enumerate(interaction_history, 1):
@@ -219,14 +342,46 @@ async def call_agent_async(runner, user_id, session_id, query, for_whatsapp=Fals
         
     content = types.Content(role="user", parts=[types.Part(text=query)])
     
-    import os
-    os.environ["LITELLM_SESSION_ID"] = session_id
-    os.environ["LITELLM_USER_ID"] = user_id
+    LITELLM_SESSION_ID.set(session_id)
+    LITELLM_USER_ID.set(user_id)
     
+    # Read the session at most once before and once after the turn; the
+    # pre-run copy goes stale as soon as the runner appends its events.
+    session = None
     if verbose_level >= 1:
-        display_state(runner.session_service, runner.app_name, user_id, session_id, "Estado ANTES de procesar")
+        session = runner.session_service.get_session(
+            app_name=runner.app_name, user_id=user_id, session_id=session_id
+        )
+        display_state(runner.session_service, runner.app_name, user_id, session_id, "Estado ANTES de procesar", session=session, verbose_level=verbose_level)
         print(f"\n{Colors.BG_GREEN}{Colors.BLACK}--- Ejecutando Consulta: {query} ---{Colors.RESET}")
+
+
+    # History entries buffered before the turn go in with the response at the end
+    history_key = (runner.app_name, user_id, session_id)
+    _active_sessions[history_key] += 1
+    try:
+        final_response_text, agent_name = await _run_agent_with_retries(
+            runner, user_id, session_id, content, for_whatsapp, max_retries, verbose_level
+        )
+
+        if final_response_text and agent_name:
+            add_agent_response_to_history(
+                runner.session_service, runner.app_name, user_id, session_id, agent_name, final_response_text
+            )
+    finally:
+        session = None
+        _active_sessions[history_key] -= 1
+        if _active_sessions[history_key] <= 0:
+            del _active_sessions[history_key]
+            session = flush_session_history(*history_key)
+
+    if verbose_level >= 1:
+        display_state(runner.session_service, runner.app_name, user_id, session_id, "Estado DESPUÉS de procesar", session=session, verbose_level=verbose_level)
         
+    return final_response_text
+
+
+async def _run_agent_with_retries(runner, user_id, session_id, content, for_whatsapp, max_retries, verbose_level):
     final_response_text = None
     agent_name = None
 
@@ -247,16 +402,11 @@ async def call_agent_async(runner, user_id, session_id, query, for_whatsapp=Fals
                 final_response_text = "Lo siento, el servicio está temporalmente saturado. Por favor intenta nuevamente en unos momentos."
                 break
         except Exception as e:
+            # Runner.run_async raises this for a deleted session; let the caller drop its cached id
+            if isinstance(e, ValueError) and str(e).startswith("Session not found"):
+                raise
             logging.error(f"ERROR durante la ejecución del agente: {e}", exc_info=True)
             final_response_text = "Lo siento, ocurrió un error al procesar tu solicitud. Por favor intenta nuevamente."
             break
 
-    if final_response_text and agent_name:
-        add_agent_response_to_history(
-            runner.session_service, runner.app_name, user_id, session_id, agent_name, final_response_text
-        )
-
-    if verbose_level >= 1:
-        display_state(runner.session_service, runner.app_name, user_id, session_id, "Estado DESPUÉS de procesar")
-        
-    return final_response_text
\ No newline at end of file
+    return final_response_text, agent_name
\ No newline at end of file
@@ -1,8 +1,15 @@
 import os
-import json
+import asyncio
+import base64
+import binascii
+import functools
+import orjson
 from datetime import datetime
-from flask import Flask, jsonify, render_template, request, abort, render_template_string  # NEW: fallback renderer
-from opensearchpy import OpenSearch
+from quart import Quart, render_template, request, render_template_string  # NEW: fallback renderer
+from cachetools import TTLCache
+from hypercorn.asyncio import serve
+from hypercorn.config import Config as HypercornConfig
+from opensearchpy import AsyncOpenSearch
 from urllib3.exceptions import InsecureRequestWarning
 import warnings
 from dotenv import load_dotenv  # NEW
@@ -15,31 +22,77 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(BASE_DIR, ".env"), override=True)
 
 INDEX_NAME = os.getenv("ES_INDEX", "vacantefinal")  # unchanged line but now reads from .env
+SEARCH_FIELDS = ["nombre_de_la_vacante", "empresa", "departamento", "area"]
 
+# At most this many OpenSearch calls in flight per process, to protect the cluster
+ES_MAX_CONCURRENCY = int(os.getenv("ES_MAX_CONCURRENCY", "20"))
+_es_semaphore = asyncio.Semaphore(ES_MAX_CONCURRENCY)
+
+@functools.lru_cache(maxsize=1)
 def get_es_client():
+    """Shared async OpenSearch client; built once so the HTTPS keep-alive pool is reused across requests."""
     host = os.getenv("ES_HOST", "opensearch.madd.com.mx")
     port = int(os.getenv("ES_PORT", "9200"))
     user = os.getenv("ES_USER", "admin")
     password = os.getenv("ES_PASSWORD", "GPSc0ntr0l1")
     timeout = int(os.getenv("ES_TIMEOUT", "30"))
+    pool_maxsize = int(os.getenv("ES_POOL_MAXSIZE", "32"))
 
-    return OpenSearch(
+    return AsyncOpenSearch(
         hosts=[{"host": host, "port": port}],
         http_auth=(user, password),
         use_ssl=True,
         verify_certs=False,
         ssl_show_warn=False,
         timeout=timeout,
+        maxsize=pool_maxsize,
+        # gzip request/response bodies; list pages are large, repetitive JSON
+        http_compress=True,
+        retry_on_timeout=True,
+        max_retries=2,
     )
 
-app = Flask(__name__, template_folder="templates")
+app = Quart(__name__, template_folder="templates")
+
+def _json(obj, status=200):
+    """JSON response encoded with orjson (used instead of jsonify for every API endpoint)."""
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
+# Serialized /api/vacantes responses keyed by (q, after, limit, exact). The search box
+# fires per keystroke, so a few seconds of staleness saves most OpenSearch round trips;
+# each PATCH flush clears it so edits show up immediately. Only touched from the event
+# loop, so it needs no lock.
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "5"))
+_list_cache = TTLCache(maxsize=256, ttl=LIST_CACHE_TTL)
+
+# Only the response parts the endpoints read; drops _shards, _score and per-hit metadata
+LIST_FILTER_PATH = ["hits.total.value", "hits.hits._id", "hits.hits._source", "hits.hits.sort"]
+MGET_FILTER_PATH = ["docs._id", "docs._index", "docs._source", "docs.found"]
+
+# /api/vacantes pages with search_after on this sort; _id breaks ties between equal dates
+LIST_SORT = [{"fecha_creacion": {"order": "desc"}}, {"_id": {"order": "asc"}}]
+
+def _encode_cursor(sort_values):
+    """Opaque page cursor: the last hit's sort tuple as URL-safe base64 JSON."""
+    return base64.urlsafe_b64encode(orjson.dumps(sort_values)).decode("ascii")
+
+def _decode_cursor(cursor):
+    values = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if not isinstance(values, list) or len(values) != len(LIST_SORT):
+        raise ValueError("invalid cursor")
+    return values
+
+@app.after_serving
+async def close_es_client():
+    if get_es_client.cache_info().currsize:
+        await get_es_client().close()
 
 @app.route("/")
-def index():
+async def index():
     templates_dir = os.path.join(BASE_DIR, "templates")
     index_tpl = os.path.join(templates_dir, "index.html")
     if os.path.exists(index_tpl):
-        return render_template("index.html", index_name=INDEX_NAME)  # pass index_name to template
+        return await render_template("index.html", index_name=INDEX_NAME)  # pass index_name to template
     # Fallback minimal UI if templates are not created yet
     html = """
     <!doctype html>
@@ -205,35 +258,62 @@ def index():
       </body>
     </html>
     """
-    return render_template_string(html, index_name=INDEX_NAME)
+    return await render_template_string(html, index_name=INDEX_NAME)
 
 @app.get("/api/vacantes")
-def list_vacantes():
+async def list_vacantes():
     """
     Query params:
       - q: search text
-      - offset: default 0
+      - after: cursor from the previous page's next_after (omit for the first page)
       - limit: default 50 (max 500)
+      - exact: 1 to use substring (wildcard) matching instead of the prefix search
     """
     try:
         q = request.args.get("q", "").strip()
-        offset = int(request.args.get("offset", "0"))
+        after = request.args.get("after") or None
         limit = min(int(request.args.get("limit", "50")), 500)
+        exact = request.args.get("exact") == "1"
+        try:
+            search_after = _decode_cursor(after) if after else None
+        except (ValueError, binascii.Error):
+            return _json({"error": "Invalid 'after' cursor"}, 400)
+
+        cache_key = (q, after, limit, exact)
+        cached = _list_cache.get(cache_key)
+        if cached is not None:
+            return app.response_class(cached, mimetype="application/json")
 
         es = get_es_client()
-        query = {"match_all": {}} if not q else {
-            "bool": {
-                "should": [
-                    {"wildcard": {"nombre_de_la_vacante.keyword": f"*{q}*"}},
-                    {"wildcard": {"empresa.keyword": f"*{q}*"}},
-                    {"wildcard": {"departamento.keyword": f"*{q}*"}},
-                    {"wildcard": {"area.keyword": f"*{q}*"}},
-                ]
+        if not q:
+            query = {"match_all": {}}
+        elif not exact:
+            # Term-prefix search over the analyzed fields: uses the inverted index
+            # instead of scanning every keyword term like a leading wildcard does
+            query = {
+                "multi_match": {
+                    "query": q,
+                    "type": "bool_prefix",
+                    "fields": SEARCH_FIELDS,
+                    # every term must match, like the substring search required the whole string
+                    "operator": "and",
+                }
+            }
+        else:
+            query = {
+                "bool": {
+                    "should": [
+                        {"wildcard": {"nombre_de_la_vacante.keyword": f"*{q}*"}},
+                        {"wildcard": {"empresa.keyword": f"*{q}*"}},
+                        {"wildcard": {"departamento.keyword": f"*{q}*"}},
+                        {"wildcard": {"area.keyword": f"*{q}*"}},
+                    ]
+                }
             }
-        }
 
+        # search_after instead of from/size: deep pages no longer make every
+        # shard collect and sort offset+limit hits
         body = {
-            "from": offset,
             "size": limit,
             "_source": [
                 "id_vacante",
@@ -246,78 +326,149 @@ def list_vacantes():
                 "fecha_creacion",
             ],
             "query": query,
-            "sort": [{"fecha_creacion": {"order": "desc"}}]
+            "sort": LIST_SORT,
         }
+        if search_after is not None:
+            body["search_after"] = search_after
 
-        resp = es.search(index=INDEX_NAME, body=body)
-        total = resp.get("hits", {}).get("total", {}).get("value", 0)
-        items = []
-        for hit in resp.get("hits", {}).get("hits", []):
-            src = hit.get("_source", {})
-            items.append({
-                "_id": hit.get("_id"),
-                "id_vacante": src.get("id_vacante"),
-                "nombre_de_la_vacante": src.get("nombre_de_la_vacante"),
-                "empresa": src.get("empresa"),
-                "departamento": src.get("departamento"),
-                "area": src.get("area"),
-                "dias_para_atender_entrevistas": src.get("dias_para_atender_entrevistas"),
-                "horarios_disponibles_para_entrevistar": src.get("horarios_disponibles_para_entrevistar"),
-                "fecha_creacion": src.get("fecha_creacion"),
-            })
-
-        return jsonify({
+        async with _es_semaphore:
+            resp = await es.search(index=INDEX_NAME, body=body, filter_path=LIST_FILTER_PATH)
+        total = resp["hits"]["total"]["value"]
+        # filter_path omits hits.hits entirely when nothing matched
+        hits = resp["hits"].get("hits", [])
+        # _source is already limited to the listed fields by the request body
+        items = [{"_id": hit["_id"], **hit.get("_source", {})} for hit in hits]
+        next_after = _encode_cursor(hits[-1]["sort"]) if hits and len(hits) == limit else None
+
+        data = orjson.dumps({
             "total": total,
-            "offset": offset,
             "limit": limit,
+            "next_after": next_after,
             "items": items
         })
+        _list_cache[cache_key] = data
+        return app.response_class(data, mimetype="application/json")
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return _json({"error": str(e)}, 500)
 
 @app.get("/api/vacantes/<doc_id>")
-def get_vacante(doc_id: str):
+async def get_vacante(doc_id: str):
     try:
         es = get_es_client()
-        res = es.get(index=INDEX_NAME, id=doc_id)
+        async with _es_semaphore:
+            res = await es.get(index=INDEX_NAME, id=doc_id)
         src = res.get("_source", {})
         # Only return string-friendly fields by default; include all for power users
-        return jsonify({
+        return _json({
             "_id": res.get("_id"),
             "_index": res.get("_index"),
             "source": src
         })
     except Exception as e:
-        return jsonify({"error": str(e)}), 404
+        return _json({"error": str(e)}, 404)
+
+MGET_MAX_IDS = 100
+
+@app.post("/api/vacantes/_mget")
+async def mget_vacantes():
+    """
+    Body:
+      { "ids": ["id1", "id2", ...] }  (at most MGET_MAX_IDS)
+    Fetches all documents in one OpenSearch _mget; ids that do not exist are omitted.
+    """
+    try:
+        try:
+            payload = orjson.loads(await request.get_data()) or {}
+        except orjson.JSONDecodeError:
+            payload = {}
+        ids = payload.get("ids") if isinstance(payload, dict) else None
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return _json({"error": "Missing or invalid 'ids' payload"}, 400)
+        if len(ids) > MGET_MAX_IDS:
+            return _json({"error": f"At most {MGET_MAX_IDS} ids per request"}, 400)
+
+        es = get_es_client()
+        async with _es_semaphore:
+            res = await es.mget(index=INDEX_NAME, body={"ids": ids}, filter_path=MGET_FILTER_PATH)
+        return _json({
+            "items": [
+                {"_id": doc["_id"], "_index": doc["_index"], "source": doc.get("_source", {})}
+                for doc in res.get("docs", []) if doc.get("found")
+            ]
+        })
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+# PATCHes arriving within PATCH_FLUSH_DELAY are merged per document and written with
+# one _bulk request (one refresh) instead of an update + refresh each. Handlers run on
+# the single event loop, so the pending dict needs no lock.
+PATCH_FLUSH_DELAY = float(os.getenv("PATCH_FLUSH_DELAY", "0.2"))
+_pending_updates = {}  # doc_id -> merged fields for the next flush
+_pending_flush = None  # future resolved with {doc_id: error} once that flush is done
+_flush_task = None
+
+async def _flush_updates_after(delay):
+    global _pending_flush
+    await asyncio.sleep(delay)
+    updates, done = dict(_pending_updates), _pending_flush
+    _pending_updates.clear()
+    _pending_flush = None
+    body = []
+    for doc_id, fields in updates.items():
+        body.append({"update": {"_id": doc_id}})
+        body.append({"doc": fields})
+    try:
+        async with _es_semaphore:
+            res = await get_es_client().bulk(index=INDEX_NAME, body=body, refresh="wait_for")
+        _list_cache.clear()
+        done.set_result({
+            item["update"]["_id"]: item["update"]["error"]
+            for item in res["items"] if "error" in item["update"]
+        })
+    except Exception as e:
+        done.set_exception(e)
 
 @app.patch("/api/vacantes/<doc_id>")
-def patch_vacante(doc_id: str):
+async def patch_vacante(doc_id: str):
     """
     Body:
       {
         "fields": { "campo1": "valor", "campo2": "valor2", ... }
       }
-    Applies OpenSearch partial update with {"doc": fields}.
+    Applies OpenSearch partial update with {"doc": fields}, batched with other
+    PATCHes received in the same PATCH_FLUSH_DELAY window; responds once written.
     """
+    global _pending_flush, _flush_task
     try:
-        payload = request.get_json(silent=True) or {}
+        try:
+            payload = orjson.loads(await request.get_data()) or {}
+        except orjson.JSONDecodeError:
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
         fields = payload.get("fields")
         if not isinstance(fields, dict) or not fields:
-            return jsonify({"error": "Missing or invalid 'fields' payload"}), 400
+            return _json({"error": "Missing or invalid 'fields' payload"}, 400)
 
         # Optional: sanitize non-string types minimally (leave as-is otherwise)
         # Example: ensure fecha_creacion is ISO if provided
         if "fecha_creacion" in fields and isinstance(fields["fecha_creacion"], datetime):
             fields["fecha_creacion"] = fields["fecha_creacion"].isoformat()
 
-        es = get_es_client()
-        es.update(index=INDEX_NAME, id=doc_id, body={"doc": fields})
-        return jsonify({"status": "ok", "updated": list(fields.keys())})
+        _pending_updates.setdefault(doc_id, {}).update(fields)
+        if _pending_flush is None:
+            _pending_flush = asyncio.get_running_loop().create_future()
+            _flush_task = asyncio.create_task(_flush_updates_after(PATCH_FLUSH_DELAY))
+        # shield: a client disconnecting must not cancel the flush shared with other PATCHes
+        errors = await asyncio.shield(_pending_flush)
+        if doc_id in errors:
+            return _json({"error": str(errors[doc_id])}, 500)
+        return _json({"status": "ok", "updated": list(fields.keys())})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return _json({"error": str(e)}, 500)
 
 @app.route("/favicon.ico")
-def favicon():
+async def favicon():
     return "", 204  # NEW: avoid 404s for favicon
 
 def main():
@@ -325,7 +476,12 @@ def main():
     port = int(os.getenv("ADMIN_PORT", "7020"))
     debug = os.getenv("ADMIN_DEBUG", "false").lower() == "true"
     print(f"Vacantes Admin running on http://{host}:{port} (index: {INDEX_NAME})")
-    app.run(host=host, port=port, debug=debug)
+    if debug:
+        app.run(host=host, port=port, debug=True)
+        return
+    config = HypercornConfig()
+    config.bind = [f"{host}:{port}"]
+    asyncio.run(serve(app, config))
 
 if __name__ == "__main__":
     main()